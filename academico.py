@@ -1,11 +1,136 @@
 # academico.py
-from flask import Blueprint, jsonify
-from db import get_connection
+from flask import Blueprint, jsonify, request, Response, stream_with_context
+from db import get_connection, ensure_schema, cerrar_sin_buffer
 from logger import log_event
+from itertools import groupby
+import json, os, time
 
 academico_bp = Blueprint("academico", __name__)
 SERVICE = "continental.edu.pe/soa/academico-service"
 
+# Tope de créditos que un estudiante puede llevar en un mismo ciclo
+MAX_CREDITOS_CICLO = int(os.environ.get("MAX_CREDITOS_CICLO", "22"))
+
+ESQUEMA_CREDITOS = [
+    """
+    CREATE TABLE IF NOT EXISTS creditos_ciclo (
+        estudiante_id INT NOT NULL,
+        ciclo VARCHAR(20) NOT NULL,
+        total_creditos INT NULL,
+        PRIMARY KEY (estudiante_id, ciclo)
+    )
+    """
+]
+
+# ======================================================
+# CONTROL DE CRÉDITOS POR CICLO (usado al matricular)
+# ======================================================
+def reservar_creditos(conn, estudiante_id, curso_id):
+    """
+    Suma los créditos del curso al acumulado del estudiante en el ciclo del curso.
+    Se ejecuta dentro de la transacción de la matrícula: la fila de creditos_ciclo
+    queda bloqueada hasta el commit/rollback, así que las matrículas simultáneas
+    de un mismo estudiante se validan una detrás de otra.
+    Devuelve None si el curso no existe, o un dict con ok, ciclo, total y creditos.
+    """
+    ensure_schema("creditos_ciclo", ESQUEMA_CREDITOS)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT creditos, ciclo FROM cursos WHERE id=%s", (curso_id,))
+        curso = cursor.fetchone()
+        if not curso:
+            return None
+        creditos, ciclo = int(curso[0]), str(curso[1])
+
+        # Crea o bloquea la fila del acumulado (bloqueo exclusivo en ambos casos)
+        cursor.execute("""
+            INSERT INTO creditos_ciclo (estudiante_id, ciclo, total_creditos)
+            VALUES (%s, %s, NULL)
+            ON DUPLICATE KEY UPDATE total_creditos = total_creditos
+        """, (estudiante_id, ciclo))
+        cursor.execute("""
+            SELECT total_creditos FROM creditos_ciclo
+            WHERE estudiante_id=%s AND ciclo=%s FOR UPDATE
+        """, (estudiante_id, ciclo))
+        total = cursor.fetchone()[0]
+
+        # Primera vez para este estudiante y ciclo: se inicializa desde sus matrículas
+        if total is None:
+            cursor.execute("""
+                SELECT COALESCE(SUM(c.creditos), 0)
+                FROM matriculas m
+                JOIN cursos c ON m.curso_id = c.id
+                WHERE m.estudiante_id = %s AND c.ciclo = %s
+            """, (estudiante_id, ciclo))
+            total = int(cursor.fetchone()[0])
+            cursor.execute("""
+                UPDATE creditos_ciclo SET total_creditos=%s
+                WHERE estudiante_id=%s AND ciclo=%s
+            """, (total, estudiante_id, ciclo))
+
+        total = int(total)
+        if total + creditos > MAX_CREDITOS_CICLO:
+            return {"ok": False, "ciclo": ciclo, "total": total, "creditos": creditos}
+
+        cursor.execute("""
+            UPDATE creditos_ciclo SET total_creditos = total_creditos + %s
+            WHERE estudiante_id=%s AND ciclo=%s
+        """, (creditos, estudiante_id, ciclo))
+        return {"ok": True, "ciclo": ciclo, "total": total + creditos, "creditos": creditos}
+    finally:
+        cursor.close()
+
+def liberar_creditos(conn, estudiante_id, curso_id):
+    """Resta los créditos del curso del acumulado del estudiante (retiro de una matrícula)."""
+    ensure_schema("creditos_ciclo", ESQUEMA_CREDITOS)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE creditos_ciclo cc
+            JOIN cursos c ON c.id = %s
+            SET cc.total_creditos = GREATEST(cc.total_creditos - c.creditos, 0)
+            WHERE cc.estudiante_id = %s AND cc.ciclo = c.ciclo AND cc.total_creditos IS NOT NULL
+        """, (curso_id, estudiante_id))
+    finally:
+        cursor.close()
+
+def invalidar_creditos_curso(conn, curso_id, ciclos):
+    """
+    Tras cambiar los créditos o el ciclo de un curso: deja en NULL el acumulado de
+    sus matriculados en esos ciclos (el anterior y el nuevo) para que
+    reservar_creditos lo vuelva a calcular desde las matrículas.
+    """
+    ensure_schema("creditos_ciclo", ESQUEMA_CREDITOS)
+    ciclos = sorted({str(c) for c in ciclos})
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            UPDATE creditos_ciclo cc
+            JOIN (SELECT DISTINCT estudiante_id FROM matriculas WHERE curso_id = %s) m
+              ON m.estudiante_id = cc.estudiante_id
+            SET cc.total_creditos = NULL
+            WHERE cc.ciclo IN ({", ".join(["%s"] * len(ciclos))})
+        """, [curso_id] + ciclos)
+    finally:
+        cursor.close()
+
+def _agrupar_por_ciclo(rows):
+    """Agrupa filas (curso, ciclo, creditos) ordenadas por ciclo en una sola pasada."""
+    ciclos = {}
+    for row in rows:
+        if row["curso"] is None:
+            continue
+        ciclo = row["ciclo"]
+        if ciclo not in ciclos:
+            ciclos[ciclo] = {"cursos": [], "total_creditos": 0}
+        ciclos[ciclo]["cursos"].append(row["curso"])
+        ciclos[ciclo]["total_creditos"] += row["creditos"]
+
+    return [
+        {"ciclo": ciclo, "cursos": data["cursos"], "total_creditos": data["total_creditos"]}
+        for ciclo, data in ciclos.items()
+    ]
+
 # ======================================================
 # LISTAR CURSOS MATRICULADOS POR CICLO (CON CRÉDITOS)
 # ======================================================
@@ -13,7 +138,7 @@ SERVICE = "continental.edu.pe/soa/academico-service"
 def obtener_matriculas_por_ciclo(codigo_estudiante):
     conn = None
     try:
-        conn = get_connection()
+        conn = get_connection(lectura=True)
         cursor = conn.cursor(dictionary=True)
 
         # Obtener datos del estudiante
@@ -32,16 +157,32 @@ def obtener_matriculas_por_ciclo(codigo_estudiante):
         estudiante_id = estudiante["id"]
 
         # Obtener cursos matriculados con ciclo y créditos
-        cursor.execute("""
-            SELECT 
-                c.nombre AS curso,
-                c.ciclo,
-                c.creditos
-            FROM matriculas m
-            JOIN cursos c ON m.curso_id = c.id
-            WHERE m.estudiante_id = %s
-            ORDER BY c.ciclo ASC
-        """, (estudiante_id,))
+        # (?incluir_archivo=1 agrega los periodos archivados: historial completo)
+        if request.args.get("incluir_archivo") == "1":
+            ensure_schema("matriculas_archivo", ["CREATE TABLE IF NOT EXISTS matriculas_archivo LIKE matriculas"])
+            cursor.execute("""
+                SELECT c.nombre AS curso, c.ciclo, c.creditos
+                FROM matriculas m
+                JOIN cursos c ON m.curso_id = c.id
+                WHERE m.estudiante_id = %s
+                UNION ALL
+                SELECT c.nombre AS curso, c.ciclo, c.creditos
+                FROM matriculas_archivo m
+                JOIN cursos c ON m.curso_id = c.id
+                WHERE m.estudiante_id = %s
+                ORDER BY ciclo ASC
+            """, (estudiante_id, estudiante_id))
+        else:
+            cursor.execute("""
+                SELECT 
+                    c.nombre AS curso,
+                    c.ciclo,
+                    c.creditos
+                FROM matriculas m
+                JOIN cursos c ON m.curso_id = c.id
+                WHERE m.estudiante_id = %s
+                ORDER BY c.ciclo ASC
+            """, (estudiante_id,))
         rows = cursor.fetchall()
 
         if not rows:
@@ -54,18 +195,7 @@ def obtener_matriculas_por_ciclo(codigo_estudiante):
             }), 200
 
         # Agrupar por ciclo y calcular créditos totales
-        ciclos = {}
-        for row in rows:
-            ciclo = row["ciclo"]
-            if ciclo not in ciclos:
-                ciclos[ciclo] = {"cursos": [], "total_creditos": 0}
-            ciclos[ciclo]["cursos"].append(row["curso"])
-            ciclos[ciclo]["total_creditos"] += row["creditos"]
-
-        resultado = [
-            {"ciclo": ciclo, "cursos": data["cursos"], "total_creditos": data["total_creditos"]}
-            for ciclo, data in ciclos.items()
-        ]
+        resultado = _agrupar_por_ciclo(rows)
 
         log_event(SERVICE, "INFO", "GET", f"Historial académico recuperado {codigo_estudiante}")
         return jsonify({
@@ -86,3 +216,90 @@ def obtener_matriculas_por_ciclo(codigo_estudiante):
         if conn:
             cursor.close()
             conn.close()
+
+# ======================================================
+# HISTORIAL ACADÉMICO DE UNA COHORTE (CARRERA / CICLO)
+# ======================================================
+TAMANO_LOTE_COHORTE = 2000
+
+def _filas_cohorte(cursor, primeras):
+    """Recorre el cursor sin buffer por lotes, sin cargar todo el resultado."""
+    filas = primeras
+    while filas:
+        yield from filas
+        filas = cursor.fetchmany(TAMANO_LOTE_COHORTE)
+
+@academico_bp.route("/cohorte/<string:carrera>", methods=["GET"])
+def obtener_historial_cohorte(carrera):
+    """
+    Historial por ciclo de todos los estudiantes de una carrera (opcionalmente
+    filtrado por ?ciclo= del estudiante). Una sola consulta ordenada por
+    estudiante y ciclo; la respuesta se arma y envía estudiante por estudiante.
+    """
+    inicio = time.time()
+    ciclo_estudiante = request.args.get("ciclo")
+
+    sql = """
+        SELECT
+            e.id AS estudiante_id,
+            e.codigo,
+            e.nombre,
+            e.ciclo AS ciclo_estudiante,
+            c.nombre AS curso,
+            c.ciclo,
+            c.creditos
+        FROM estudiantes e
+        LEFT JOIN matriculas m ON m.estudiante_id = e.id
+        LEFT JOIN cursos c ON m.curso_id = c.id
+        WHERE e.carrera = %s
+    """
+    params = [carrera]
+    if ciclo_estudiante:
+        sql += " AND e.ciclo = %s"
+        params.append(ciclo_estudiante)
+    sql += " ORDER BY e.id ASC, c.ciclo ASC"
+
+    # La conexión y la consulta van antes de la respuesta: si fallan se devuelve
+    # un 500 normal; en streaming solo queda el recorrido de las filas
+    conn = None
+    cursor = None
+    try:
+        # Respuesta en streaming: no se corta con el deadline del request
+        conn = get_connection(deadline=False, lectura=True)
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        cursor.execute(sql, params)
+        primeras = cursor.fetchmany(TAMANO_LOTE_COHORTE)
+    except Exception as e:
+        log_event(SERVICE, "ERROR", "GET", f"Error al obtener historial de cohorte {carrera}: {e}", inicio)
+        if conn:
+            cerrar_sin_buffer(conn, cursor)
+        return jsonify({
+            "status": "error",
+            "message": "Error interno del servidor"
+        }), 500
+
+    def generar():
+        total = 0
+        try:
+            yield '{"status": "success", "carrera": %s, "estudiantes": [' % json.dumps(carrera)
+            for _, filas in groupby(_filas_cohorte(cursor, primeras), key=lambda r: r["estudiante_id"]):
+                filas = list(filas)
+                estudiante = {
+                    "codigo_estudiante": filas[0]["codigo"],
+                    "nombre": filas[0]["nombre"],
+                    "ciclo_estudiante": filas[0]["ciclo_estudiante"],
+                    "matriculas": _agrupar_por_ciclo(filas)
+                }
+                yield ("," if total else "") + json.dumps(estudiante, default=str)
+                total += 1
+            yield "]}"
+
+            log_event(SERVICE, "INFO", "GET", f"Historial de cohorte {carrera} recuperado: {total} estudiantes", inicio)
+        except Exception as e:
+            # La respuesta ya empezó: se corta el JSON y queda el error en el log
+            log_event(SERVICE, "ERROR", "GET", f"Error al obtener historial de cohorte {carrera}: {e}", inicio)
+
+    # Se cierra al terminar la respuesta, aunque el cliente corte antes de la primera fila
+    respuesta = Response(stream_with_context(generar()), mimetype="application/json")
+    respuesta.call_on_close(lambda: cerrar_sin_buffer(conn, cursor))
+    return respuesta
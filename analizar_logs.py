@@ -0,0 +1,266 @@
+# analizar_logs.py
+"""
+Analizador de latencias de soa_matricula.log (incluye archivos rotados y comprimidos).
+
+    python analizar_logs.py                                   # log actual + rotados
+    python analizar_logs.py --desde "2025-10-22 00:00:00" --top 20
+    python analizar_logs.py soa_matricula.log.1.gz soa_matricula.log --json
+
+Lee línea por línea: la memoria depende del número de servicios/métodos y del
+tamaño del top, no del tamaño de los archivos.
+"""
+from collections import defaultdict, deque
+import argparse, bz2, glob, gzip, heapq, json, lzma, math, os, re, sys
+
+LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "soa_matricula.log")
+
+RE_LINEA = re.compile(
+    r"^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)(?:,\d+)? \[(\w+)\] \[([^\]]*)\] \[([^\]]*)\] \[req:([^\]]*)\] (.*)$"
+)
+RE_DURACION = re.compile(r"\| t:([\d.]+|None)s\s*$")
+RE_ACCESO = re.compile(r'"(\w+) (\S+) HTTP/[\d.]+"\s+(\d{3})')
+RE_ANSI = re.compile(r"\x1b\[[0-9;]*m")
+
+# Un evento se une con la línea de acceso de Werkzeug que llega poco después
+VENTANA_UNION = 2
+MAX_PENDIENTES = 10000
+
+# Histograma logarítmico: cada cubeta es un 5% más ancha que la anterior
+FACTOR_CUBETA = 1.05
+MINIMO_CUBETA = 0.0001
+
+# ======================================================
+# LECTURA DE ARCHIVOS
+# ======================================================
+def _abrir(ruta):
+    if ruta.endswith(".gz"):
+        return gzip.open(ruta, "rt", encoding="utf-8", errors="replace")
+    if ruta.endswith(".bz2"):
+        return bz2.open(ruta, "rt", encoding="utf-8", errors="replace")
+    if ruta.endswith(".xz"):
+        return lzma.open(ruta, "rt", encoding="utf-8", errors="replace")
+    return open(ruta, "r", encoding="utf-8", errors="replace")
+
+def archivos_por_defecto(base=LOG_FILE):
+    """Rotados del más antiguo al más nuevo (log.3.gz, log.2, log.1) y luego el actual."""
+    def numero(ruta):
+        sufijo = ruta[len(base) + 1:].split(".")[0]
+        return int(sufijo) if sufijo.isdigit() else 0
+    rotados = sorted(glob.glob(base + ".*"), key=numero, reverse=True)
+    return rotados + ([base] if os.path.exists(base) else [])
+
+def leer_lineas(rutas):
+    for ruta in rutas:
+        with _abrir(ruta) as f:
+            for linea in f:
+                yield linea.rstrip("\r\n")
+
+# ======================================================
+# ESTADÍSTICAS
+# ======================================================
+def _servicio_corto(servicio):
+    return servicio.rstrip("/").split("/")[-1]
+
+def _servicio_de_ruta(ruta):
+    for parte in ruta.split("/"):
+        if parte.endswith("-service"):
+            return parte
+    return None
+
+class Histograma:
+    def __init__(self):
+        self.cubetas = defaultdict(int)
+        self.total = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def agregar(self, valor):
+        indice = 0 if valor <= MINIMO_CUBETA else int(math.log(valor / MINIMO_CUBETA, FACTOR_CUBETA)) + 1
+        self.cubetas[indice] += 1
+        self.total += 1
+        self.suma += valor
+        self.maximo = max(self.maximo, valor)
+
+    def percentil(self, p):
+        if not self.total:
+            return None
+        objetivo = math.ceil(self.total * p / 100)
+        acumulado = 0
+        for indice in sorted(self.cubetas):
+            acumulado += self.cubetas[indice]
+            if acumulado >= objetivo:
+                limite = MINIMO_CUBETA * FACTOR_CUBETA ** indice
+                return round(min(limite, self.maximo), 4)
+        return round(self.maximo, 4)
+
+class Estadistica:
+    def __init__(self):
+        self.eventos = 0
+        self.errores = 0
+        self.advertencias = 0
+        self.latencias = Histograma()
+        self.estados_http = defaultdict(int)
+
+class Analizador:
+    def __init__(self, desde=None, hasta=None, top=10):
+        self.desde = desde
+        self.hasta = hasta
+        self.top = top
+        self.por_operacion = defaultdict(Estadistica)   # (servicio, método)
+        self.lentos = []                                 # heap (t, ts, req, servicio, método, mensaje)
+        self.pendientes = defaultdict(deque)             # (servicio, método) -> eventos sin unir
+        self.num_pendientes = 0
+        self.lineas = 0
+        self.no_reconocidas = 0
+        self.accesos_sin_evento = 0
+
+    def procesar(self, linea):
+        self.lineas += 1
+        m = RE_LINEA.match(linea)
+        if not m:
+            self.no_reconocidas += 1
+            return
+        ts, nivel, servicio, metodo, req, mensaje = m.groups()
+        if (self.desde and ts < self.desde) or (self.hasta and ts >= self.hasta):
+            return
+        if servicio == "-":
+            self._acceso(ts, RE_ANSI.sub("", mensaje))
+        else:
+            self._evento(ts, nivel, _servicio_corto(servicio), metodo, req, mensaje)
+
+    def _evento(self, ts, nivel, servicio, metodo, req, mensaje):
+        est = self.por_operacion[(servicio, metodo)]
+        est.eventos += 1
+        if nivel == "ERROR":
+            est.errores += 1
+        elif nivel == "WARNING":
+            est.advertencias += 1
+
+        d = RE_DURACION.search(mensaje)
+        if d and d.group(1) != "None":
+            t = float(d.group(1))
+            est.latencias.agregar(t)
+            item = (t, ts, req, servicio, metodo, mensaje.split(" | ")[0][:120])
+            if len(self.lentos) < self.top:
+                heapq.heappush(self.lentos, item)
+            elif t > self.lentos[0][0]:
+                heapq.heapreplace(self.lentos, item)
+
+        if servicio.endswith("-service"):
+            self.pendientes[(servicio, metodo)].append((ts, nivel))
+            self.num_pendientes += 1
+            if self.num_pendientes > MAX_PENDIENTES:
+                self._descartar_viejos(ts)
+
+    def _acceso(self, ts, mensaje):
+        a = RE_ACCESO.search(mensaje)
+        if not a:
+            return
+        metodo, ruta, estado = a.group(1), a.group(2), int(a.group(3))
+        servicio = _servicio_de_ruta(ruta)
+        if not servicio:
+            return
+        cola = self.pendientes.get((servicio, metodo))
+        # Descarta eventos que ya no pueden unirse con esta línea
+        while cola and _segundos(cola[0][0], ts) > VENTANA_UNION:
+            cola.popleft()
+            self.num_pendientes -= 1
+        if not cola:
+            self.accesos_sin_evento += 1
+            return
+        _, nivel = cola.popleft()
+        self.num_pendientes -= 1
+        est = self.por_operacion[(servicio, metodo)]
+        est.estados_http[estado] += 1
+        if estado >= 500 and nivel != "ERROR":
+            est.errores += 1
+
+    def _descartar_viejos(self, ts):
+        for cola in self.pendientes.values():
+            while cola and _segundos(cola[0][0], ts) > VENTANA_UNION:
+                cola.popleft()
+                self.num_pendientes -= 1
+
+    def resultado(self):
+        operaciones = []
+        for (servicio, metodo), est in sorted(self.por_operacion.items()):
+            h = est.latencias
+            operaciones.append({
+                "servicio": servicio,
+                "metodo": metodo,
+                "eventos": est.eventos,
+                "errores": est.errores,
+                "tasa_error": round(est.errores / est.eventos, 4) if est.eventos else 0,
+                "advertencias": est.advertencias,
+                "con_latencia": h.total,
+                "p50": h.percentil(50),
+                "p90": h.percentil(90),
+                "p99": h.percentil(99),
+                "max": round(h.maximo, 4) if h.total else None,
+                "promedio": round(h.suma / h.total, 4) if h.total else None,
+                "estados_http": dict(sorted(est.estados_http.items())),
+            })
+        lentos = [
+            {"t": t, "fecha": ts, "request_id": req, "servicio": s, "metodo": m, "mensaje": msg}
+            for t, ts, req, s, m, msg in sorted(self.lentos, reverse=True)
+        ]
+        return {
+            "lineas": self.lineas,
+            "no_reconocidas": self.no_reconocidas,
+            "accesos_sin_evento": self.accesos_sin_evento,
+            "operaciones": operaciones,
+            "mas_lentos": lentos,
+        }
+
+def _segundos(ts_inicio, ts_fin):
+    """Diferencia en segundos entre dos marcas 'YYYY-MM-DD HH:MM:SS' (mismo día o no)."""
+    if ts_inicio[:10] != ts_fin[:10]:
+        return VENTANA_UNION + 1
+    h1, m1, s1 = ts_inicio[11:].split(":")
+    h2, m2, s2 = ts_fin[11:].split(":")
+    return (int(h2) - int(h1)) * 3600 + (int(m2) - int(m1)) * 60 + int(s2) - int(s1)
+
+# ======================================================
+# SALIDA
+# ======================================================
+def imprimir(resultado, salida=sys.stdout):
+    print(f"Líneas leídas: {resultado['lineas']} (no reconocidas: {resultado['no_reconocidas']})", file=salida)
+    print(file=salida)
+    cabecera = f"{'servicio':<24} {'método':<8} {'eventos':>8} {'err%':>7} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}"
+    print(cabecera, file=salida)
+    print("-" * len(cabecera), file=salida)
+    for op in resultado["operaciones"]:
+        def fmt(v):
+            return f"{v:.4f}" if v is not None else "-"
+        print(f"{op['servicio'][:24]:<24} {op['metodo'][:8]:<8} {op['eventos']:>8} "
+              f"{op['tasa_error'] * 100:>6.2f}% {fmt(op['p50']):>8} {fmt(op['p90']):>8} "
+              f"{fmt(op['p99']):>8} {fmt(op['max']):>8}", file=salida)
+    print(file=salida)
+    print("Solicitudes más lentas:", file=salida)
+    for lento in resultado["mas_lentos"]:
+        print(f"  {lento['t']:.4f}s  {lento['fecha']}  req:{lento['request_id']}  "
+              f"{lento['servicio']} {lento['metodo']}  {lento['mensaje']}", file=salida)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Percentiles de latencia y errores a partir de soa_matricula.log")
+    parser.add_argument("archivos", nargs="*", help="Archivos a leer en orden (por defecto el log y sus rotados)")
+    parser.add_argument("--desde", help="Inicio de la ventana, 'YYYY-MM-DD HH:MM:SS'")
+    parser.add_argument("--hasta", help="Fin (exclusivo) de la ventana, 'YYYY-MM-DD HH:MM:SS'")
+    parser.add_argument("--top", type=int, default=10, help="Cantidad de solicitudes más lentas a mostrar")
+    parser.add_argument("--json", action="store_true", help="Salida en JSON")
+    args = parser.parse_args(argv)
+
+    rutas = args.archivos or archivos_por_defecto()
+    analizador = Analizador(args.desde, args.hasta, args.top)
+    for linea in leer_lineas(rutas):
+        analizador.procesar(linea)
+
+    resultado = analizador.resultado()
+    if args.json:
+        json.dump(resultado, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        imprimir(resultado)
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,18 @@ from matriculas import matriculas_bp
 from academico import academico_bp
 from evaluaciones import evaluaciones_bp
 from reportes import reportes_bp
-from logger import log_event
-import requests, time
+from exportaciones import exportaciones_bp
+from promedios import promedios_bp
+from eventos import eventos_bp
+from trabajos import trabajos_bp
+from metricas import metricas_bp
+from resumen import resumen_bp
+from cierre_ciclo import cierre_bp
+from limitador import instalar_limitador
+from perfilador import perfiles_bp, instalar_perfilador
+from logger import log_event, init_request_tracing
+from cliente_servicios import iniciar_deadline
+import cliente_servicios as servicios
 
 
 
@@ -22,7 +32,26 @@ app.register_blueprint(cursos_bp, url_prefix="/api/v1/continental.edu.pe/soa/cur
 app.register_blueprint(matriculas_bp, url_prefix="/api/v1/continental.edu.pe/soa/matriculas-service")
 app.register_blueprint(academico_bp, url_prefix="/api/v1/continental.edu.pe/soa/academico-service")
 app.register_blueprint(evaluaciones_bp, url_prefix="/api/v1/continental.edu.pe/soa/evaluaciones-service")
+app.register_blueprint(exportaciones_bp, url_prefix="/api/v1/continental.edu.pe/soa/exportaciones-service")
+app.register_blueprint(promedios_bp, url_prefix="/api/v1/continental.edu.pe/soa/promedios-service")
+app.register_blueprint(eventos_bp, url_prefix="/api/v1/continental.edu.pe/soa/eventos-service")
+app.register_blueprint(trabajos_bp, url_prefix="/api/v1/continental.edu.pe/soa/reportes-service")
+app.register_blueprint(metricas_bp, url_prefix="/api/v1/continental.edu.pe/soa/metricas-service")
+app.register_blueprint(resumen_bp, url_prefix="/api/v1/continental.edu.pe/soa/resumen-service")
+app.register_blueprint(cierre_bp, url_prefix="/api/v1/continental.edu.pe/soa/cierre-service")
+app.register_blueprint(perfiles_bp, url_prefix="/api/v1/continental.edu.pe/soa/perfiles-service")
 app.register_blueprint(reportes_bp)
+
+# Limitador primero: rechaza antes de cualquier otro trabajo
+instalar_limitador(app)
+# Perfilado opcional (PERFIL_TOKEN / PERFIL_MUESTREO): cubre el resto del request
+instalar_perfilador(app)
+
+@app.before_request
+def _antes_de_request():
+    init_request_tracing()
+    iniciar_deadline()
+
 # Rutas de la interfaz web ----------------------------
 BASE_URL = "http://127.0.0.1:5000/api/v1/continental.edu.pe/soa"
 
@@ -35,7 +64,7 @@ def home():
 # -------------------------
 @app.route("/alumnos")
 def alumnos_list():
-    resp = requests.get(f"{BASE_URL}/estudiantes-service/")
+    resp = servicios.get(f"{BASE_URL}/estudiantes-service/")
     alumnos = resp.json().get("data", []) if resp.status_code == 200 else []
     return render_template("alumnos.html", alumnos=alumnos)
 
@@ -50,13 +79,13 @@ def alumnos_nuevo():
             "ciclo": request.form["ciclo"],
             "estado": request.form.get("estado", "activo")
         }
-        requests.post(f"{BASE_URL}/estudiantes-service/", json=data)
+        servicios.post(f"{BASE_URL}/estudiantes-service/", json=data)
         return redirect(url_for("alumnos_list"))
     return render_template("alumno_form.html")
 
 @app.route("/alumnos/eliminar/<int:id>")
 def alumnos_eliminar(id):
-    requests.delete(f"{BASE_URL}/estudiantes-service/{id}")
+    servicios.delete(f"{BASE_URL}/estudiantes-service/{id}")
     return redirect(url_for("alumnos_list"))
 
 # -------------------------
@@ -64,7 +93,7 @@ def alumnos_eliminar(id):
 # -------------------------
 @app.route("/cursos")
 def cursos_list():
-    resp = requests.get(f"{BASE_URL}/cursos-service/")
+    resp = servicios.get(f"{BASE_URL}/cursos-service/")
     cursos = resp.json().get("data", []) if resp.status_code == 200 else []
     return render_template("cursos.html", cursos=cursos)
 
@@ -77,13 +106,13 @@ def cursos_nuevo():
             "creditos": request.form["creditos"],
             "ciclo": request.form["ciclo"]
         }
-        requests.post(f"{BASE_URL}/cursos-service/", json=data)
+        servicios.post(f"{BASE_URL}/cursos-service/", json=data)
         return redirect(url_for("cursos_list"))
     return render_template("curso_form.html")
 
 @app.route("/cursos/eliminar/<int:id>")
 def cursos_eliminar(id):
-    requests.delete(f"{BASE_URL}/cursos-service/{id}")
+    servicios.delete(f"{BASE_URL}/cursos-service/{id}")
     return redirect(url_for("cursos_list"))
 
 # -------------------------
@@ -92,7 +121,7 @@ def cursos_eliminar(id):
 @app.route("/matriculas")
 def matriculas_list():
     """Mostrar la tabla de matrículas"""
-    resp = requests.get(f"{BASE_URL}/matriculas-service/listar")
+    resp = servicios.get(f"{BASE_URL}/matriculas-service/listar")
     matriculas = resp.json() if resp.status_code == 200 else []
     return render_template("matriculas.html", matriculas=matriculas)
 
@@ -100,8 +129,8 @@ def matriculas_list():
 def matriculas_nuevo():
     """Formulario para registrar matrículas"""
     # Obtener estudiantes y cursos desde las APIs
-    resp_est = requests.get(f"{BASE_URL}/estudiantes-service/")
-    resp_cur = requests.get(f"{BASE_URL}/cursos-service/")
+    resp_est = servicios.get(f"{BASE_URL}/estudiantes-service/")
+    resp_cur = servicios.get(f"{BASE_URL}/cursos-service/")
     estudiantes = resp_est.json().get("data", []) if resp_est.status_code == 200 else []
     cursos = resp_cur.json().get("data", []) if resp_cur.status_code == 200 else []
 
@@ -110,7 +139,7 @@ def matriculas_nuevo():
             "estudiante_id": request.form["estudiante_id"],
             "curso_id": request.form["curso_id"]
         }
-        requests.post(f"{BASE_URL}/matriculas-service/", json=data)
+        servicios.post(f"{BASE_URL}/matriculas-service/", json=data)
         return redirect(url_for("matriculas_list"))
 
     return render_template("matricula_form.html", estudiantes=estudiantes, cursos=cursos)
@@ -123,7 +152,7 @@ def evaluaciones_list():
     # Llamamos directamente al blueprint que lista evaluaciones para la web
     # La idea es obtener un listado simple de registros
     try:
-        resp = requests.get(f"{BASE_URL}/evaluaciones-service/")
+        resp = servicios.get(f"{BASE_URL}/evaluaciones-service/")
         evaluaciones = resp.json().get("data", []) if resp.status_code == 200 else []
     except Exception as e:
         evaluaciones = []
@@ -132,8 +161,8 @@ def evaluaciones_list():
 @app.route("/evaluaciones/nueva", methods=["GET", "POST"])
 def evaluaciones_nueva():
     # Obtener estudiantes y cursos (igual que en matriculas/cursos)
-    resp_est = requests.get(f"{BASE_URL}/estudiantes-service/")
-    resp_cur = requests.get(f"{BASE_URL}/cursos-service/")
+    resp_est = servicios.get(f"{BASE_URL}/estudiantes-service/")
+    resp_cur = servicios.get(f"{BASE_URL}/cursos-service/")
     estudiantes = resp_est.json().get("data", []) if resp_est.status_code == 200 else []
     cursos = resp_cur.json().get("data", []) if resp_cur.status_code == 200 else []
 
@@ -145,7 +174,7 @@ def evaluaciones_nueva():
             "nota": request.form["nota"]
         }
         # Llamada al servicio API interno
-        requests.post(f"{BASE_URL}/evaluaciones-service/", json=data)
+        servicios.post(f"{BASE_URL}/evaluaciones-service/", json=data)
         return redirect(url_for("evaluaciones_list"))
 
     return render_template("evaluacion_form.html", estudiantes=estudiantes, cursos=cursos)
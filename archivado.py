@@ -0,0 +1,220 @@
+# archivado.py
+from db import get_connection, ensure_schema
+from logger import log_event
+from eventos import registrar_evento
+from academico import ESQUEMA_CREDITOS
+from promedios import descontar_notas
+from lista_espera import ESQUEMA_LISTA_ESPERA, recalcular_cupo
+import argparse, time
+
+SERVICE = "continental.edu.pe/soa/archivado-service"
+
+TAMANO_LOTE = 500
+PAUSA_LOTE = 0.05   # segundos entre lotes para no acaparar la BD
+
+ESQUEMA_ARCHIVO = [
+    "CREATE TABLE IF NOT EXISTS matriculas_archivo LIKE matriculas",
+    "CREATE TABLE IF NOT EXISTS evaluaciones_archivo LIKE evaluaciones",
+    "CREATE TABLE IF NOT EXISTS logs_archivo LIKE logs",
+]
+
+def _marcadores(valores):
+    return ", ".join(["%s"] * len(valores))
+
+# ======================================================
+# ARCHIVADO DE PERIODOS CERRADOS (por lotes)
+# ======================================================
+def archivar_matriculas(hasta, lote=TAMANO_LOTE, pausa=PAUSA_LOTE):
+    """
+    Mueve a matriculas_archivo las matrículas no activas anteriores a 'hasta',
+    junto con sus evaluaciones. Cada lote es una transacción corta que recorre
+    la tabla por id, así que se puede interrumpir y volver a ejecutar.
+    """
+    ensure_schema("archivo", ESQUEMA_ARCHIVO)
+    total_matriculas = total_evaluaciones = 0
+    ultimo_id = 0
+    while True:
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT id FROM matriculas
+                WHERE id > %s AND fecha < %s AND estado <> 'activo'
+                ORDER BY id LIMIT %s
+            """, (ultimo_id, hasta, lote))
+            ids = [fila[0] for fila in cursor.fetchall()]
+            if not ids:
+                break
+            m = _marcadores(ids)
+
+            cursor.execute(f"""
+                INSERT IGNORE INTO evaluaciones_archivo
+                SELECT ev.* FROM evaluaciones ev
+                JOIN matriculas m ON ev.id_estudiante = m.estudiante_id AND ev.id_curso = m.curso_id
+                WHERE m.id IN ({m})
+            """, ids)
+            cursor.execute(f"""
+                DELETE ev FROM evaluaciones ev
+                JOIN matriculas m ON ev.id_estudiante = m.estudiante_id AND ev.id_curso = m.curso_id
+                WHERE m.id IN ({m})
+            """, ids)
+            total_evaluaciones += cursor.rowcount
+
+            cursor.execute(f"INSERT IGNORE INTO matriculas_archivo SELECT * FROM matriculas WHERE id IN ({m})", ids)
+            cursor.execute(f"DELETE FROM matriculas WHERE id IN ({m})", ids)
+            total_matriculas += cursor.rowcount
+            # Cambia la versión de los datos (caché de reportes) y avisa al feed de cambios
+            registrar_evento(conn, "archivo.matriculas", "archivo", ids[-1], {
+                "desde_id": ids[0], "hasta_id": ids[-1], "matriculas": len(ids)
+            })
+            conn.commit()
+            ultimo_id = ids[-1]
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        time.sleep(pausa)
+    return total_matriculas, total_evaluaciones
+
+def archivar_logs(hasta, lote=TAMANO_LOTE, pausa=PAUSA_LOTE):
+    ensure_schema("archivo", ESQUEMA_ARCHIVO)
+    total = 0
+    ultimo_id = 0
+    while True:
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT id FROM logs WHERE id > %s AND fecha_hora < %s
+                ORDER BY id LIMIT %s
+            """, (ultimo_id, hasta, lote))
+            ids = [fila[0] for fila in cursor.fetchall()]
+            if not ids:
+                break
+            m = _marcadores(ids)
+            cursor.execute(f"INSERT IGNORE INTO logs_archivo SELECT * FROM logs WHERE id IN ({m})", ids)
+            cursor.execute(f"DELETE FROM logs WHERE id IN ({m})", ids)
+            total += cursor.rowcount
+            conn.commit()
+            ultimo_id = ids[-1]
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+        time.sleep(pausa)
+    return total
+
+# ======================================================
+# BORRADO POR LOTES DE DEPENDIENTES (estudiante / curso)
+# ======================================================
+def _borrar_por_lotes(conn, tabla, columna, valor, lote, antes_de_borrar=None):
+    """Borra las filas de 'tabla' con columna=valor en lotes, con commit por lote."""
+    cursor = conn.cursor()
+    try:
+        while True:
+            cursor.execute(f"SELECT id FROM {tabla} WHERE {columna}=%s LIMIT %s", (valor, lote))
+            ids = [fila[0] for fila in cursor.fetchall()]
+            if not ids:
+                break
+            if antes_de_borrar:
+                antes_de_borrar(conn, ids)
+            cursor.execute(f"DELETE FROM {tabla} WHERE id IN ({_marcadores(ids)})", ids)
+            conn.commit()
+            if len(ids) < lote:
+                break
+    finally:
+        cursor.close()
+
+def borrar_dependientes_estudiante(conn, estudiante_id, lote=TAMANO_LOTE):
+    """
+    Evaluaciones, matrículas (vivas y archivadas) y listas de espera del estudiante,
+    por lotes. Los cursos donde tenía matrícula activa recuentan su cupo y promueven
+    a su lista de espera. Sus acumulados de créditos y promedios se borran junto
+    con el estudiante.
+    """
+    ensure_schema("archivo", ESQUEMA_ARCHIVO)
+    ensure_schema("lista_espera", ESQUEMA_LISTA_ESPERA)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT curso_id FROM matriculas WHERE estudiante_id=%s AND estado='activo'",
+                   (estudiante_id,))
+    cursos = [fila[0] for fila in cursor.fetchall()]
+    cursor.close()
+
+    _borrar_por_lotes(conn, "lista_espera", "estudiante_id", estudiante_id, lote)
+    _borrar_por_lotes(conn, "evaluaciones", "id_estudiante", estudiante_id, lote)
+    _borrar_por_lotes(conn, "matriculas", "estudiante_id", estudiante_id, lote)
+    _borrar_por_lotes(conn, "evaluaciones_archivo", "id_estudiante", estudiante_id, lote)
+    _borrar_por_lotes(conn, "matriculas_archivo", "estudiante_id", estudiante_id, lote)
+    for curso_id in cursos:
+        recalcular_cupo(conn, curso_id)
+        conn.commit()
+
+def borrar_dependientes_curso(conn, curso_id, lote=TAMANO_LOTE):
+    """
+    Lista de espera, evaluaciones y matrículas (vivas y archivadas) del curso, por
+    lotes, descontando en el mismo lote los promedios y los créditos de cada
+    estudiante. El cupo del curso se borra junto con el curso.
+    """
+    ensure_schema("archivo", ESQUEMA_ARCHIVO)
+    ensure_schema("creditos_ciclo", ESQUEMA_CREDITOS)
+    ensure_schema("lista_espera", ESQUEMA_LISTA_ESPERA)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT creditos, ciclo FROM cursos WHERE id=%s", (curso_id,))
+    curso = cursor.fetchone()
+    cursor.close()
+    if not curso:
+        return
+    creditos, ciclo = int(curso[0]), str(curso[1])
+
+    def liberar_creditos(conn, matricula_ids):
+        c = conn.cursor()
+        try:
+            c.execute(f"""
+                UPDATE creditos_ciclo cc
+                JOIN matriculas m ON m.estudiante_id = cc.estudiante_id
+                SET cc.total_creditos = GREATEST(cc.total_creditos - %s, 0)
+                WHERE m.id IN ({_marcadores(matricula_ids)})
+                  AND cc.ciclo = %s AND cc.total_creditos IS NOT NULL
+            """, [creditos] + list(matricula_ids) + [ciclo])
+        finally:
+            c.close()
+
+    _borrar_por_lotes(conn, "lista_espera", "curso_id", curso_id, lote)
+    _borrar_por_lotes(conn, "evaluaciones", "id_curso", curso_id, lote, descontar_notas)
+    _borrar_por_lotes(conn, "matriculas", "curso_id", curso_id, lote, liberar_creditos)
+    _borrar_por_lotes(conn, "evaluaciones_archivo", "id_curso", curso_id, lote,
+                      lambda conn, ids: descontar_notas(conn, ids, "evaluaciones_archivo"))
+    _borrar_por_lotes(conn, "matriculas_archivo", "curso_id", curso_id, lote)
+
+# ======================================================
+# LÍNEA DE COMANDOS
+# python archivado.py --hasta 2025-03-01 [--lote 500] [--sin-logs]
+# ======================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archiva matrículas, evaluaciones y logs de periodos cerrados")
+    parser.add_argument("--hasta", required=True, help="Fecha de corte exclusiva (YYYY-MM-DD)")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE)
+    parser.add_argument("--pausa", type=float, default=PAUSA_LOTE)
+    parser.add_argument("--sin-logs", action="store_true", help="No archivar la tabla logs")
+    args = parser.parse_args(argv)
+
+    inicio = time.time()
+    matriculas, evaluaciones = archivar_matriculas(args.hasta, args.lote, args.pausa)
+    log_event(SERVICE, "INFO", "SERVICE",
+              f"Archivadas {matriculas} matrículas y {evaluaciones} evaluaciones anteriores a {args.hasta}", inicio)
+    print(f"Matrículas archivadas: {matriculas}, evaluaciones archivadas: {evaluaciones}")
+
+    if not args.sin_logs:
+        inicio = time.time()
+        logs = archivar_logs(args.hasta, args.lote, args.pausa)
+        log_event(SERVICE, "INFO", "SERVICE", f"Archivados {logs} logs anteriores a {args.hasta}", inicio)
+        print(f"Logs archivados: {logs}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+# cierre_ciclo.py
+from flask import Blueprint, request, jsonify
+from db import get_connection, ensure_schema
+from logger import log_event
+from eventos import registrar_evento
+from promedios import ESQUEMA_PROMEDIOS
+from lista_espera import ESQUEMA_LISTA_ESPERA, recalcular_cupo
+from datetime import datetime
+import argparse, os, threading, time
+
+cierre_bp = Blueprint("cierre", __name__)
+SERVICE = "continental.edu.pe/soa/cierre-service"
+
+TAMANO_LOTE = 500
+PAUSA_LOTE = 0.05
+CICLO_MAXIMO = int(os.environ.get("CICLO_MAXIMO", "10"))   # los de último ciclo no avanzan
+
+ESQUEMA_CIERRE = [
+    """
+    CREATE TABLE IF NOT EXISTS cierre_ciclo_progreso (
+        periodo VARCHAR(20) NOT NULL,
+        paso VARCHAR(20) NOT NULL,
+        hasta DATETIME NOT NULL,
+        id_maximo INT NOT NULL,
+        ultimo_id INT NOT NULL DEFAULT 0,
+        filas INT NOT NULL DEFAULT 0,
+        lotes INT NOT NULL DEFAULT 0,
+        terminado TINYINT(1) NOT NULL DEFAULT 0,
+        actualizado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (periodo, paso)
+    )
+    """
+]
+
+# Orden de los pasos (cada paso recorre la tabla del mismo nombre): primero se
+# cierran las matrículas del periodo, luego avanzan los estudiantes
+PASOS = ("matriculas", "estudiantes")
+
+_en_curso = set()
+_en_curso_lock = threading.Lock()
+
+# ======================================================
+# UN LOTE POR PASO (rango de ids, en una sola transacción)
+# ======================================================
+def _aplicar_lote(conn, cursor, paso, desde, hasta_id, fecha_corte):
+    """Actualiza los ids en (desde, hasta_id]; devuelve las filas afectadas."""
+    if paso == "matriculas":
+        cursor.execute("""
+            UPDATE matriculas SET estado = 'cerrado'
+            WHERE id > %s AND id <= %s AND estado = 'activo' AND fecha < %s
+        """, (desde, hasta_id, fecha_corte))
+        filas = cursor.rowcount
+        # Las matrículas cerradas dejan de ocupar cupo: se recuenta el cupo de cada
+        # curso con tope y se promueve a su lista de espera en la misma transacción
+        cursor.execute("""
+            SELECT DISTINCT cc.curso_id FROM cursos_cupos cc
+            JOIN matriculas m ON m.curso_id = cc.curso_id
+            WHERE m.id > %s AND m.id <= %s AND m.estado = 'cerrado'
+            ORDER BY cc.curso_id
+        """, (desde, hasta_id))
+        for fila in cursor.fetchall():
+            recalcular_cupo(conn, fila["curso_id"])
+        return filas
+
+    cursor.execute("""
+        UPDATE estudiantes SET ciclo = ciclo + 1
+        WHERE id > %s AND id <= %s AND estado = 'activo' AND ciclo < %s
+    """, (desde, hasta_id, CICLO_MAXIMO))
+    filas = cursor.rowcount
+    # El ranking agrupa por el ciclo del estudiante
+    cursor.execute("""
+        UPDATE promedio_estudiante p
+        JOIN estudiantes e ON e.id = p.estudiante_id
+        SET p.ciclo = e.ciclo
+        WHERE e.id > %s AND e.id <= %s AND p.ciclo <> e.ciclo
+    """, (desde, hasta_id))
+    return filas
+
+def _iniciar_pasos(periodo, fecha_corte):
+    """
+    Crea las filas de progreso la primera vez. El id máximo de cada tabla se fija
+    al iniciar: lo creado después (p. ej. estudiantes nuevos) no entra en este cierre.
+    Al reanudar se conservan la fecha de corte y los ids originales.
+    """
+    conn = get_connection(deadline=False)
+    cursor = conn.cursor()
+    try:
+        for paso in PASOS:
+            cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {paso}")
+            id_maximo = cursor.fetchone()[0]
+            cursor.execute("""
+                INSERT IGNORE INTO cierre_ciclo_progreso (periodo, paso, hasta, id_maximo)
+                VALUES (%s, %s, %s, %s)
+            """, (periodo, paso, fecha_corte, id_maximo))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+def _ejecutar_paso(periodo, paso, lote, pausa, al_avanzar=None):
+    while True:
+        inicio = time.time()
+        conn = get_connection(deadline=False)
+        cursor = conn.cursor(dictionary=True)
+        try:
+            # El bloqueo de la fila de progreso serializa a dos ejecuciones simultáneas
+            cursor.execute("""
+                SELECT hasta, id_maximo, ultimo_id, filas, lotes, terminado
+                FROM cierre_ciclo_progreso WHERE periodo=%s AND paso=%s FOR UPDATE
+            """, (periodo, paso))
+            estado = cursor.fetchone()
+            if estado["terminado"]:
+                conn.commit()
+                return
+
+            cursor.execute(f"""
+                SELECT MAX(id) AS hasta_id FROM (
+                    SELECT id FROM {paso} WHERE id > %s AND id <= %s ORDER BY id LIMIT %s
+                ) t
+            """, (estado["ultimo_id"], estado["id_maximo"], lote))
+            hasta_id = cursor.fetchone()["hasta_id"]
+            if hasta_id is None:
+                cursor.execute("""
+                    UPDATE cierre_ciclo_progreso SET terminado = 1 WHERE periodo=%s AND paso=%s
+                """, (periodo, paso))
+                conn.commit()
+                return
+
+            filas = _aplicar_lote(conn, cursor, paso, estado["ultimo_id"], hasta_id, estado["hasta"])
+            cursor.execute("""
+                UPDATE cierre_ciclo_progreso
+                SET ultimo_id = %s, filas = filas + %s, lotes = lotes + 1
+                WHERE periodo=%s AND paso=%s
+            """, (hasta_id, filas, periodo, paso))
+            registrar_evento(conn, f"cierre_ciclo.{paso}", "cierre_ciclo", periodo, {
+                "periodo": periodo, "paso": paso, "desde_id": estado["ultimo_id"] + 1,
+                "hasta_id": hasta_id, "filas": filas
+            })
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+            conn.close()
+
+        log_event(SERVICE, "INFO", "SERVICE",
+                  f"Cierre {periodo} [{paso}] ids {estado['ultimo_id'] + 1}-{hasta_id}: {filas} filas", inicio)
+        if al_avanzar:
+            al_avanzar(paso, hasta_id, estado["id_maximo"], estado["filas"] + filas)
+        time.sleep(pausa)
+
+def cerrar_ciclo(periodo, fecha_corte=None, lote=TAMANO_LOTE, pausa=PAUSA_LOTE, al_avanzar=None):
+    """
+    Cierra las matrículas activas anteriores a la fecha de corte y avanza el ciclo
+    de los estudiantes activos, por lotes. Cada lote guarda su avance en la misma
+    transacción, así que se puede interrumpir y volver a lanzar con el mismo
+    periodo sin aplicar dos veces ningún rango.
+    """
+    ensure_schema("cierre_ciclo", ESQUEMA_CIERRE)
+    ensure_schema("promedios", ESQUEMA_PROMEDIOS)
+    ensure_schema("lista_espera", ESQUEMA_LISTA_ESPERA)
+    _iniciar_pasos(periodo, fecha_corte or datetime.now())
+    for paso in PASOS:
+        _ejecutar_paso(periodo, paso, lote, pausa, al_avanzar)
+    return progreso(periodo)
+
+def progreso(periodo):
+    ensure_schema("cierre_ciclo", ESQUEMA_CIERRE)
+    conn = get_connection(deadline=False)
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT paso, hasta, id_maximo, ultimo_id, filas, lotes, terminado, actualizado_en
+            FROM cierre_ciclo_progreso WHERE periodo=%s
+        """, (periodo,))
+        pasos = {f["paso"]: f for f in cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
+    for f in pasos.values():
+        f["terminado"] = bool(f["terminado"])
+        f["porcentaje"] = 100.0 if f["terminado"] or not f["id_maximo"] else \
+            round(min(f["ultimo_id"] / f["id_maximo"], 1) * 100, 1)
+        f["hasta"] = str(f["hasta"])
+        f["actualizado_en"] = str(f["actualizado_en"])
+    return {"periodo": periodo, "en_curso": periodo in _en_curso,
+            "terminado": bool(pasos) and all(f["terminado"] for f in pasos.values()),
+            "pasos": [pasos[p] for p in PASOS if p in pasos]}
+
+def _cerrar_en_segundo_plano(periodo, fecha_corte, lote):
+    inicio = time.time()
+    try:
+        cerrar_ciclo(periodo, fecha_corte, lote)
+        log_event(SERVICE, "INFO", "SERVICE", f"Cierre de ciclo {periodo} terminado", inicio)
+    except Exception as e:
+        log_event(SERVICE, "ERROR", "SERVICE", f"Error en el cierre de ciclo {periodo}: {e}", inicio)
+    finally:
+        with _en_curso_lock:
+            _en_curso.discard(periodo)
+
+# ======================================================
+# INICIAR / REANUDAR CIERRE (POST)
+# {"periodo": "2025-1", "hasta": "2025-07-31", "lote": 500}
+# ======================================================
+@cierre_bp.route("/", methods=["POST"])
+def iniciar_cierre():
+    inicio = time.time()
+    data = request.get_json() or {}
+    periodo = str(data.get("periodo") or "").strip()
+    lote = data.get("lote", TAMANO_LOTE)
+
+    if not periodo or len(periodo) > 20 or not isinstance(lote, int) or lote <= 0:
+        log_event(SERVICE, "WARNING", "POST", "Datos inválidos para el cierre de ciclo", inicio)
+        return jsonify({"status": "error", "message": "Se requiere 'periodo' (máx. 20 caracteres) y un 'lote' positivo"}), 400
+    try:
+        fecha_corte = datetime.strptime(data["hasta"], "%Y-%m-%d") if data.get("hasta") else None
+    except (TypeError, ValueError):
+        return jsonify({"status": "error", "message": "Formato de 'hasta' inválido (YYYY-MM-DD)"}), 400
+
+    with _en_curso_lock:
+        if periodo in _en_curso:
+            return jsonify({"status": "success", "message": "Cierre ya en curso", "periodo": periodo}), 202
+        _en_curso.add(periodo)
+    threading.Thread(target=_cerrar_en_segundo_plano, args=(periodo, fecha_corte, lote),
+                     name=f"cierre-{periodo}", daemon=True).start()
+
+    log_event(SERVICE, "INFO", "POST", f"Cierre de ciclo {periodo} iniciado", inicio)
+    return jsonify({"status": "success", "message": "Cierre iniciado", "periodo": periodo}), 202
+
+# ======================================================
+# PROGRESO DEL CIERRE (GET)
+# ======================================================
+@cierre_bp.route("/<string:periodo>", methods=["GET"])
+def ver_progreso(periodo):
+    inicio = time.time()
+    try:
+        data = progreso(periodo)
+    except Exception as e:
+        log_event(SERVICE, "ERROR", "GET", f"Error al consultar cierre {periodo}: {e}", inicio)
+        return jsonify({"status": "error", "message": "Error al consultar el cierre"}), 500
+    if not data["pasos"]:
+        return jsonify({"status": "error", "message": "Cierre no encontrado"}), 404
+    return jsonify({"status": "success", "data": data}), 200
+
+# ======================================================
+# LÍNEA DE COMANDOS
+# python cierre_ciclo.py --periodo 2025-1 [--hasta 2025-07-31] [--lote 500]
+# ======================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cierra las matrículas del periodo y avanza el ciclo de los estudiantes")
+    parser.add_argument("--periodo", required=True, help="Identificador del cierre (permite reanudarlo)")
+    parser.add_argument("--hasta", help="Fecha de corte exclusiva de matrículas (YYYY-MM-DD); por defecto, ahora")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE)
+    parser.add_argument("--pausa", type=float, default=PAUSA_LOTE)
+    args = parser.parse_args(argv)
+
+    def mostrar(paso, ultimo_id, id_maximo, filas):
+        print(f"[{paso}] hasta id {ultimo_id}/{id_maximo} - {filas} filas actualizadas")
+
+    fecha_corte = datetime.strptime(args.hasta, "%Y-%m-%d") if args.hasta else None
+    resultado = cerrar_ciclo(args.periodo, fecha_corte, args.lote, args.pausa, mostrar)
+    for paso in resultado["pasos"]:
+        print(f"{paso['paso']}: {paso['filas']} filas en {paso['lotes']} lotes")
+
+if __name__ == "__main__":
+    main()
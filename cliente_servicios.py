@@ -0,0 +1,182 @@
+# cliente_servicios.py
+from flask import g, has_request_context, request
+from logger import _get_client_ip
+from metricas import registrar_proveedor
+from limitador import HEADER_ORIGEN, ORIGEN_INTERFAZ
+import os, threading, time
+import requests
+
+# ======================================================
+# CONFIGURACIÓN
+# ======================================================
+HEADER_DEADLINE = "X-Request-Deadline"     # epoch en segundos (float) en que vence la petición
+TIMEOUT_DEFECTO = float(os.environ.get("SERVICIOS_TIMEOUT", "5"))
+DEADLINE_DEFECTO = float(os.environ.get("REQUEST_DEADLINE", "10"))
+DEADLINE_MAXIMO = float(os.environ.get("REQUEST_DEADLINE_MAX", "60"))
+UMBRAL_FALLOS = int(os.environ.get("BREAKER_UMBRAL_FALLOS", "5"))
+ESPERA_ABIERTO = float(os.environ.get("BREAKER_ESPERA", "30"))
+
+# ======================================================
+# DEADLINE DE LA PETICIÓN
+# ======================================================
+def iniciar_deadline():
+    """
+    before_request: toma el deadline que envió quien llama (acotado a DEADLINE_MAXIMO)
+    o fija uno por defecto. Lo usan este cliente y db.get_connection.
+    """
+    ahora = time.time()
+    deadline = ahora + DEADLINE_DEFECTO
+    recibido = request.headers.get(HEADER_DEADLINE)
+    if recibido:
+        try:
+            deadline = min(float(recibido), ahora + DEADLINE_MAXIMO)
+        except ValueError:
+            pass
+    g.deadline = deadline
+
+def tiempo_restante():
+    """Segundos que le quedan a la petición actual, o None fuera de un request."""
+    if not has_request_context():
+        return None
+    deadline = getattr(g, "deadline", None)
+    return None if deadline is None else deadline - time.time()
+
+# ======================================================
+# CIRCUIT BREAKER POR DEPENDENCIA
+# ======================================================
+class CircuitBreaker:
+    """
+    cerrado: todo pasa; tras UMBRAL_FALLOS fallos seguidos se abre.
+    abierto: se rechaza sin llamar; pasado ESPERA_ABIERTO pasa a semiabierto.
+    semiabierto: una sola llamada de prueba; si funciona se cierra, si falla se reabre.
+    Los rechazos por carga (429, 503 con Retry-After) no cuentan como fallo.
+    """
+    def __init__(self, nombre, umbral=UMBRAL_FALLOS, espera=ESPERA_ABIERTO):
+        self.nombre = nombre
+        self.umbral = umbral
+        self.espera = espera
+        self.estado = "cerrado"
+        self.fallos = 0
+        self.abierto_desde = 0.0
+        self.sondeo_en_curso = False
+        self._lock = threading.Lock()
+
+    def permitir(self):
+        with self._lock:
+            if self.estado == "cerrado":
+                return True
+            if self.estado == "abierto" and time.time() - self.abierto_desde >= self.espera:
+                self.estado = "semiabierto"
+                self.sondeo_en_curso = False
+            if self.estado == "semiabierto" and not self.sondeo_en_curso:
+                self.sondeo_en_curso = True
+                return True
+            return False
+
+    def exito(self):
+        with self._lock:
+            self.estado = "cerrado"
+            self.fallos = 0
+            self.sondeo_en_curso = False
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            if self.estado == "semiabierto" or self.fallos >= self.umbral:
+                self.estado = "abierto"
+                self.abierto_desde = time.time()
+                self.sondeo_en_curso = False
+
+    def neutro(self):
+        """El servicio respondió pero rechazó por carga: ni fallo ni éxito."""
+        with self._lock:
+            if self.estado == "semiabierto":
+                # La prueba no dice si se recuperó: se espera otra vez antes de la siguiente
+                self.estado = "abierto"
+                self.abierto_desde = time.time()
+                self.sondeo_en_curso = False
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def _breaker(dependencia):
+    with _breakers_lock:
+        if dependencia not in _breakers:
+            _breakers[dependencia] = CircuitBreaker(dependencia)
+        return _breakers[dependencia]
+
+def estado_breakers():
+    return {nombre: {"estado": b.estado, "fallos": b.fallos} for nombre, b in list(_breakers.items())}
+
+registrar_proveedor("breakers", estado_breakers)
+
+def _dependencia(url):
+    """'.../soa/estudiantes-service/...' -> 'estudiantes-service'"""
+    for parte in url.split("/"):
+        if parte.endswith("-service"):
+            return parte
+    return url.split("/")[2] if "://" in url else url
+
+# ======================================================
+# RESPUESTA DEGRADADA (breaker abierto o deadline vencido)
+# ======================================================
+class RespuestaDegradada:
+    """Imita lo que app.py usa de requests.Response para no romper las vistas."""
+    status_code = 503
+
+    def __init__(self, dependencia, motivo):
+        self.dependencia = dependencia
+        self.motivo = motivo
+
+    def json(self):
+        return {"status": "error", "message": f"{self.dependencia} no disponible: {self.motivo}", "data": []}
+
+# ======================================================
+# LLAMADAS ENTRE SERVICIOS
+# ======================================================
+def _llamar(metodo, url, **kwargs):
+    dependencia = _dependencia(url)
+    breaker = _breaker(dependencia)
+
+    restante = tiempo_restante()
+    if restante is not None and restante <= 0:
+        return RespuestaDegradada(dependencia, "deadline vencido")
+    if not breaker.permitir():
+        return RespuestaDegradada(dependencia, "circuito abierto")
+
+    timeout = TIMEOUT_DEFECTO if restante is None else min(TIMEOUT_DEFECTO, restante)
+    headers = dict(kwargs.pop("headers", None) or {})
+    headers[HEADER_DEADLINE] = f"{time.time() + timeout:.3f}"
+    if has_request_context():
+        # El servicio llamado identifica (y limita) al cliente original, no a la interfaz web
+        headers.setdefault("X-Forwarded-For", _get_client_ip())
+        if request.headers.get("X-User"):
+            headers.setdefault("X-User", request.headers["X-User"])
+        headers.setdefault(HEADER_ORIGEN, ORIGEN_INTERFAZ)
+
+    try:
+        resp = requests.request(metodo, url, headers=headers, timeout=timeout, **kwargs)
+    except requests.RequestException as e:
+        breaker.fallo()
+        return RespuestaDegradada(dependencia, type(e).__name__)
+    except Exception:
+        # Cualquier otro error también libera la llamada de prueba del semiabierto
+        breaker.fallo()
+        raise
+
+    if resp.status_code == 429 or (resp.status_code == 503 and "Retry-After" in resp.headers):
+        breaker.neutro()
+    elif resp.status_code >= 500:
+        breaker.fallo()
+    else:
+        breaker.exito()
+    return resp
+
+def get(url, **kwargs):
+    return _llamar("GET", url, **kwargs)
+
+def post(url, **kwargs):
+    return _llamar("POST", url, **kwargs)
+
+def delete(url, **kwargs):
+    return _llamar("DELETE", url, **kwargs)
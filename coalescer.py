@@ -0,0 +1,91 @@
+# coalescer.py
+from flask import request, jsonify, make_response
+from cliente_servicios import tiempo_restante
+from metricas import incrementar
+import functools, os, threading, time
+
+# ======================================================
+# CONFIGURACIÓN
+# ======================================================
+# Segundos que una respuesta ya calculada se sigue entregando a requests
+# idénticos (0 = solo se comparte mientras la consulta está en curso)
+VENTANA_REUTILIZACION = float(os.environ.get("COALESCER_VENTANA", "0"))
+HEADERS_NO_COMPARTIDOS = {"set-cookie", "content-length"}
+MAX_CLAVES = 1000
+
+class _Vuelo:
+    """Una ejecución de la vista; los requests idénticos esperan su resultado."""
+    def __init__(self):
+        self.listo = threading.Event()
+        self.respuesta = None     # (cuerpo, estado, headers)
+        self.error = None
+        self.terminado = 0.0
+
+_vuelos = {}
+_vuelos_lock = threading.Lock()
+
+def _clave():
+    return request.path, tuple(sorted(request.args.items(multi=True)))
+
+def _vigente(vuelo):
+    if not vuelo.listo.is_set():
+        return True
+    return (vuelo.error is None and vuelo.respuesta[1] == 200
+            and time.time() - vuelo.terminado < VENTANA_REUTILIZACION)
+
+def _responder(vuelo):
+    if vuelo.error is not None:
+        raise vuelo.error
+    cuerpo, estado, headers = vuelo.respuesta
+    return make_response(cuerpo, estado, headers)
+
+# ======================================================
+# DECORADOR PARA VISTAS DE SOLO LECTURA
+# ======================================================
+def coalescer(vista):
+    """
+    Single-flight por proceso: los GET concurrentes con la misma ruta y los
+    mismos parámetros esperan a la primera ejecución y reciben su respuesta
+    serializada, en vez de lanzar cada uno la misma consulta a la BD.
+    """
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        clave = _clave()
+        with _vuelos_lock:
+            vuelo = _vuelos.get(clave)
+            lider = vuelo is None or not _vigente(vuelo)
+            if lider:
+                if len(_vuelos) >= MAX_CLAVES:
+                    for k in [k for k, v in _vuelos.items() if not _vigente(v)]:
+                        del _vuelos[k]
+                vuelo = _vuelos[clave] = _Vuelo()
+
+        if not lider:
+            if vuelo.listo.is_set():
+                incrementar("coalescer.reutilizadas")
+                return _responder(vuelo)
+            restante = tiempo_restante()
+            if not vuelo.listo.wait(None if restante is None else max(restante, 0)):
+                incrementar("coalescer.vencidas")
+                return jsonify({"status": "error", "message": "Tiempo de espera agotado"}), 504
+            incrementar("coalescer.compartidas")
+            return _responder(vuelo)
+
+        incrementar("coalescer.ejecutadas")
+        try:
+            respuesta = make_response(vista(*args, **kwargs))
+            vuelo.respuesta = (respuesta.get_data(), respuesta.status_code,
+                               [(k, v) for k, v in respuesta.headers.items()
+                                if k.lower() not in HEADERS_NO_COMPARTIDOS])
+            return respuesta
+        except Exception as e:
+            vuelo.error = e
+            raise
+        finally:
+            vuelo.terminado = time.time()
+            vuelo.listo.set()
+            if not _vigente(vuelo):
+                with _vuelos_lock:
+                    if _vuelos.get(clave) is vuelo:
+                        del _vuelos[clave]
+    return envoltura
@@ -0,0 +1,157 @@
+# consultas.py
+from mysql.connector import Error
+from metricas import registrar_proveedor
+import threading, time
+
+# ======================================================
+# REGISTRO DE CONSULTAS CON NOMBRE
+# Cada sentencia se prepara en el servidor una vez por conexión del pool y se
+# reutiliza en las siguientes llamadas (sin volver a parsear el SQL).
+# ======================================================
+CONSULTAS = {
+    # Estudiantes
+    "estudiantes.listar": "SELECT * FROM estudiantes",
+    "estudiantes.por_codigo": """
+        SELECT id, codigo, nombre, carrera, ciclo, correo, estado
+        FROM estudiantes
+        WHERE codigo = %s
+    """,
+    "estudiantes.id_por_codigo": "SELECT id FROM estudiantes WHERE codigo = %s",
+    "estudiantes.existe_codigo": "SELECT COUNT(*) AS existe FROM estudiantes WHERE codigo = %s",
+    "estudiantes.existe": "SELECT COUNT(*) AS existe FROM estudiantes WHERE id = %s",
+
+    # Cursos
+    "cursos.listar": "SELECT * FROM cursos",
+    "cursos.por_codigo": """
+        SELECT id, codigo, nombre, creditos, ciclo
+        FROM cursos
+        WHERE codigo = %s
+    """,
+    "cursos.id_por_codigo": "SELECT id FROM cursos WHERE codigo = %s",
+
+    # Matrículas
+    "matriculas.listar": """
+        SELECT m.id, e.nombre AS estudiante, e.ciclo AS ciclo_estudiante,
+               c.nombre AS curso, m.fecha, m.estado
+        FROM matriculas m
+        JOIN estudiantes e ON m.estudiante_id = e.id
+        JOIN cursos c ON m.curso_id = c.id
+        ORDER BY m.id DESC
+    """,
+    "matriculas.listar_con_archivo": """
+        SELECT m.id, e.nombre AS estudiante, e.ciclo AS ciclo_estudiante,
+               c.nombre AS curso, m.fecha, m.estado
+        FROM (SELECT * FROM matriculas UNION ALL SELECT * FROM matriculas_archivo) m
+        JOIN estudiantes e ON m.estudiante_id = e.id
+        JOIN cursos c ON m.curso_id = c.id
+        ORDER BY m.id DESC
+    """,
+    "matriculas.existe": """
+        SELECT COUNT(*) AS existe FROM matriculas
+        WHERE estudiante_id = %s AND curso_id = %s
+    """,
+
+    # Evaluaciones
+    "evaluaciones.listar": """
+        SELECT e.id AS id_estudiante, e.nombre AS estudiante,
+               c.id AS id_curso, c.nombre AS curso,
+               ev.nota
+        FROM evaluaciones ev
+        JOIN estudiantes e ON ev.id_estudiante = e.id
+        JOIN cursos c ON ev.id_curso = c.id
+    """,
+    "evaluaciones.cursos_de_estudiante": """
+        SELECT curso, codigo_curso
+        FROM vista_matriculas
+        WHERE codigo_estudiante = %s
+    """,
+}
+
+ER_UNKNOWN_STMT_HANDLER = 1243   # la sesión perdió la sentencia (reconexión)
+
+# ======================================================
+# ESTADÍSTICAS POR SENTENCIA (por proceso)
+# ======================================================
+_estadisticas = {}
+_estadisticas_lock = threading.Lock()
+
+def _registrar(nombre, filas, duracion):
+    with _estadisticas_lock:
+        e = _estadisticas.setdefault(nombre, {"llamadas": 0, "filas": 0, "errores": 0,
+                                              "tiempo_total_ms": 0.0, "tiempo_max_ms": 0.0})
+        if filas is None:
+            e["errores"] += 1
+            return
+        ms = duracion * 1000
+        e["llamadas"] += 1
+        e["filas"] += filas
+        e["tiempo_total_ms"] += ms
+        e["tiempo_max_ms"] = max(e["tiempo_max_ms"], ms)
+
+def estadisticas():
+    """Sentencias ordenadas por tiempo total en BD (las que más pesan primero)."""
+    with _estadisticas_lock:
+        filas = [dict(e, nombre=n) for n, e in _estadisticas.items()]
+    for e in filas:
+        e["tiempo_total_ms"] = round(e["tiempo_total_ms"], 2)
+        e["tiempo_max_ms"] = round(e["tiempo_max_ms"], 2)
+        e["tiempo_medio_ms"] = round(e["tiempo_total_ms"] / e["llamadas"], 2) if e["llamadas"] else 0
+    return sorted(filas, key=lambda e: e["tiempo_total_ms"], reverse=True)
+
+registrar_proveedor("consultas", estadisticas)
+
+# ======================================================
+# EJECUCIÓN CON SENTENCIAS PREPARADAS
+# ======================================================
+def _cursor_preparado(conn, nombre):
+    """
+    Cursor preparado de 'nombre' guardado en la conexión física (no en el
+    envoltorio del pool, que cambia en cada get_connection).
+    """
+    fisica = getattr(conn, "_cnx", conn)
+    cache = getattr(fisica, "_consultas_preparadas", None)
+    if cache is None:
+        cache = fisica._consultas_preparadas = {}
+    cursor = cache.get(nombre)
+    if cursor is None:
+        cursor = cache[nombre] = fisica.cursor(prepared=True, dictionary=True)
+    return cursor
+
+def _descartar(conn, nombre):
+    fisica = getattr(conn, "_cnx", conn)
+    cursor = getattr(fisica, "_consultas_preparadas", {}).pop(nombre, None)
+    if cursor is not None:
+        try:
+            cursor.close()
+        except Error:
+            pass
+
+def ejecutar(conn, nombre, params=(), uno=False):
+    """
+    Ejecuta la consulta registrada 'nombre' y devuelve sus filas como dicts
+    (o solo la primera, o None, si uno=True). El cursor no se cierra: queda
+    preparado para la siguiente llamada con esta conexión.
+    """
+    # Se pasa siempre el mismo objeto str: el cursor preparado solo reutiliza
+    # la sentencia si recibe exactamente la misma cadena que la vez anterior.
+    sql = CONSULTAS[nombre]
+    inicio = time.time()
+    try:
+        try:
+            cursor = _cursor_preparado(conn, nombre)
+            cursor.execute(sql, tuple(params))
+            filas = cursor.fetchall()
+        except Error as e:
+            _descartar(conn, nombre)
+            if e.errno != ER_UNKNOWN_STMT_HANDLER:
+                raise
+            cursor = _cursor_preparado(conn, nombre)
+            cursor.execute(sql, tuple(params))
+            filas = cursor.fetchall()
+    except Exception:
+        _registrar(nombre, None, 0)
+        raise
+    _registrar(nombre, len(filas), time.time() - inicio)
+    if uno:
+        return filas[0] if filas else None
+    return filas
@@ -1,7 +1,13 @@
 # cursos.py
 from flask import Blueprint, request, jsonify
-from db import get_connection
+from db import get_connection, clave_codigo
+from consultas import ejecutar
+from coalescer import coalescer
 from logger import log_event
+from eventos import registrar_evento
+from archivado import borrar_dependientes_curso
+from promedios import recalcular_promedios_curso
+from academico import invalidar_creditos_curso
 import time
 
 # ======================================================
@@ -9,17 +15,16 @@ import time
 # ======================================================
 cursos_bp = Blueprint("cursos", __name__)
 SERVICE = "continental.edu.pe/soa/cursos-service"
+MAX_CODIGOS_LOTE = 5000
 
 # ======================================================
 # LISTAR CURSOS (GET)
 # ======================================================
 @cursos_bp.route("/", methods=["GET"])
+@coalescer
 def listar_cursos():
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM cursos")
-    data = cursor.fetchall()
-    cursor.close()
+    conn = get_connection(lectura=True)
+    data = ejecutar(conn, "cursos.listar")
     conn.close()
     return jsonify({"status": "success", "data": data})
 
@@ -31,14 +36,8 @@ def get_curso_por_codigo(codigo):
     inicio = time.time()
     conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT id, codigo, nombre, creditos, ciclo
-            FROM cursos
-            WHERE codigo=%s
-        """, (codigo,))
-        curso = cursor.fetchone()
+        conn = get_connection(lectura=True)
+        curso = ejecutar(conn, "cursos.por_codigo", (codigo,), uno=True)
 
         if not curso:
             log_event(SERVICE, "WARNING", "GET",
@@ -52,6 +51,54 @@ def get_curso_por_codigo(codigo):
         log_event(SERVICE, "ERROR", "GET",
                     f"Error al consultar curso {codigo}: {e}", inicio)
         return jsonify({"status": "error", "message": "Error al obtener curso"}), 500
+    finally:
+        if conn:
+            conn.close()
+
+# ======================================================
+# CONSULTA MASIVA POR CÓDIGOS (POST)
+# ======================================================
+@cursos_bp.route("/codigos", methods=["POST"])
+def get_cursos_por_codigos():
+    inicio = time.time()
+    data = request.get_json() or {}
+    codigos = data.get("codigos")
+
+    if not isinstance(codigos, list) or not codigos:
+        log_event(SERVICE, "WARNING", "POST",
+                    "Consulta masiva sin lista de códigos", inicio)
+        return jsonify({"status": "error", "message": "Debe enviar una lista 'codigos'"}), 400
+
+    # Quitar duplicados conservando el orden de llegada
+    codigos = list(dict.fromkeys(str(c) for c in codigos))
+    if len(codigos) > MAX_CODIGOS_LOTE:
+        log_event(SERVICE, "WARNING", "POST",
+                    f"Consulta masiva excede el límite: {len(codigos)} códigos", inicio)
+        return jsonify({"status": "error",
+                        "message": f"Máximo {MAX_CODIGOS_LOTE} códigos por consulta"}), 400
+
+    conn = None
+    try:
+        conn = get_connection(lectura=True)
+        cursor = conn.cursor(dictionary=True)
+        marcadores = ", ".join(["%s"] * len(codigos))
+        cursor.execute(f"""
+            SELECT id, codigo, nombre, creditos, ciclo
+            FROM cursos
+            WHERE codigo IN ({marcadores})
+        """, codigos)
+        data = cursor.fetchall()
+
+        encontrados = {clave_codigo(curso["codigo"]) for curso in data}
+        faltantes = [c for c in codigos if clave_codigo(c) not in encontrados]
+
+        log_event(SERVICE, "INFO", "POST",
+                    f"Consulta masiva de {len(codigos)} cursos ({len(faltantes)} no encontrados)", inicio)
+        return jsonify({"status": "success", "data": data, "faltantes": faltantes}), 200
+    except Exception as e:
+        log_event(SERVICE, "ERROR", "POST",
+                    f"Error en consulta masiva de cursos: {e}", inicio)
+        return jsonify({"status": "error", "message": "Error al obtener cursos"}), 500
     finally:
         if conn:
             cursor.close()
@@ -77,6 +124,9 @@ def create_curso():
         cursor = conn.cursor()
         query = "INSERT INTO cursos (codigo, nombre, creditos, ciclo) VALUES (%s, %s, %s, %s)"
         cursor.execute(query, (codigo, nombre, creditos, ciclo))
+        registrar_evento(conn, "curso.creado", "curso", cursor.lastrowid, {
+            "codigo": codigo, "nombre": nombre, "creditos": creditos, "ciclo": ciclo
+        })
         conn.commit()
         print("✅ Curso guardado correctamente:", codigo, nombre, creditos, ciclo)
         return jsonify({"mensaje": "Curso agregado exitosamente"}), 201
@@ -117,17 +167,30 @@ def update_curso(id):
     try:
         conn = get_connection()
         cursor = conn.cursor()
+        cursor.execute("SELECT creditos, ciclo FROM cursos WHERE id=%s FOR UPDATE", (id,))
+        anterior = cursor.fetchone()
+        if anterior is None:
+            conn.rollback()
+            log_event(SERVICE, "WARNING", "PUT",
+                        f"Curso ID {id} no encontrado para actualización", inicio)
+            return jsonify({"status": "error", "message": "Curso no encontrado"}), 404
+
         cursor.execute("""
             UPDATE cursos
             SET nombre=%s, codigo=%s, creditos=%s, ciclo=%s
             WHERE id=%s
         """, (nombre, codigo, creditos, ciclo, id))
-        conn.commit()
 
-        if cursor.rowcount == 0:
-            log_event(SERVICE, "WARNING", "PUT",
-                        f"Curso ID {id} no encontrado para actualización", inicio)
-            return jsonify({"status": "error", "message": "Curso no encontrado"}), 404
+        # Los promedios y los acumulados de créditos se sumaron con el peso y el
+        # ciclo anteriores del curso
+        if int(anterior[0]) != creditos or str(anterior[1]) != str(ciclo):
+            recalcular_promedios_curso(conn, id)
+            invalidar_creditos_curso(conn, id, (anterior[1], ciclo))
+
+        registrar_evento(conn, "curso.actualizado", "curso", id, {
+            "codigo": codigo, "nombre": nombre, "creditos": creditos, "ciclo": ciclo
+        })
+        conn.commit()
 
         log_event(SERVICE, "INFO", "PUT",
                         f"Curso {codigo} actualizado correctamente", inicio)
@@ -151,14 +214,21 @@ def delete_curso(id):
     try:
         conn = get_connection()
         cursor = conn.cursor()
+        # Evaluaciones y matrículas primero, en lotes cortos (no un gran borrado en cascada)
+        borrar_dependientes_curso(conn, id)
+
         cursor.execute("DELETE FROM cursos WHERE id=%s", (id,))
-        conn.commit()
 
         if cursor.rowcount == 0:
+            conn.rollback()
             log_event(SERVICE, "WARNING", "DELETE",
                         f"Curso ID {id} no encontrado", inicio)
             return jsonify({"status": "error", "message": "Curso no encontrado"}), 404
 
+        cursor.execute("DELETE FROM cursos_cupos WHERE curso_id=%s", (id,))
+        registrar_evento(conn, "curso.eliminado", "curso", id, {})
+        conn.commit()
+
         log_event(SERVICE, "INFO", "DELETE",
                     f"Curso ID {id} eliminado correctamente", inicio)
         return jsonify({"status": "success", "message": "Curso eliminado correctamente"}), 200
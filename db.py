@@ -1,5 +1,8 @@
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.pooling import MySQLConnectionPool
+from flask import g, has_request_context, request
+import os, threading, time, unicodedata
 
 DB_CONFIG = {
     "host": "localhost",
@@ -9,10 +12,195 @@ DB_CONFIG = {
     "port": 3306
 }
 
-def get_connection():
+# Réplica de solo lectura (opcional). Para probar en local basta con una segunda
+# instancia de MySQL, por ejemplo: DB_REPLICA_HOST=127.0.0.1 DB_REPLICA_PORT=3307
+# (con DB_REPLICA_VERIFICAR_LAG=0 si esa instancia no está replicando).
+DB_REPLICA_CONFIG = None
+if os.environ.get("DB_REPLICA_HOST"):
+    DB_REPLICA_CONFIG = dict(DB_CONFIG,
+                             host=os.environ["DB_REPLICA_HOST"],
+                             port=int(os.environ.get("DB_REPLICA_PORT", DB_CONFIG["port"])),
+                             user=os.environ.get("DB_REPLICA_USER", DB_CONFIG["user"]),
+                             password=os.environ.get("DB_REPLICA_PASSWORD", DB_CONFIG["password"]))
+
+DB_POOL_TAMANO = int(os.environ.get("DB_POOL_TAMANO", "10"))
+REPLICA_LAG_MAXIMO = float(os.environ.get("DB_REPLICA_LAG_MAXIMO", "5"))
+REPLICA_VERIFICAR_LAG = os.environ.get("DB_REPLICA_VERIFICAR_LAG", "1") == "1"
+REPLICA_INTERVALO_VERIFICACION = 5
+
+# ======================================================
+# POOLS DE CONEXIONES (primario y réplica)
+# ======================================================
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _conectar(nombre, config):
+    """
+    Conexión del pool; si el pool está agotado o la conexión que entrega falla al
+    validarse (ya salió de la cola), se abre una conexión directa.
+    """
+    with _pools_lock:
+        if nombre not in _pools:
+            # Sin reset de sesión al devolver la conexión, para que sobrevivan las
+            # sentencias preparadas de consultas.py; la sesión se limpia al entregarla.
+            _pools[nombre] = MySQLConnectionPool(pool_name=f"gestion_matricula_{nombre}",
+                                                 pool_size=DB_POOL_TAMANO,
+                                                 pool_reset_session=False, **config)
+    try:
+        conn = _pools[nombre].get_connection()
+    except Error:
+        return mysql.connector.connect(**config)
+    if conn.in_transaction:
+        conn.rollback()     # transacción que un request anterior dejó abierta
+    return conn
+
+def cerrar_sin_buffer(conn, cursor):
+    """
+    Cierra un cursor sin buffer y devuelve su conexión. Si el cliente cortó la
+    descarga quedan filas sin leer y cursor.close() falla: la conexión física se
+    cierra para que el pool la reabra al entregarla, en vez de devolverla sucia.
+    """
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except Error as e:
-        print("ERROR: No se pudo conectar a la BD:", e)
+        if cursor:
+            cursor.close()
+    except Error:
+        try:
+            getattr(conn, "_cnx", conn).close()
+        except Error:
+            pass
+    conn.close()
+
+# ======================================================
+# ESTADO DE LA RÉPLICA (retraso consultado cada pocos segundos)
+# ======================================================
+_replica = {"ok": False, "verificado": 0.0}
+_replica_lock = threading.Lock()
+
+def _verificar_replica():
+    conn = _conectar("replica", DB_REPLICA_CONFIG)
+    try:
+        if not REPLICA_VERIFICAR_LAG:
+            return True
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Error:
+            cursor.execute("SHOW SLAVE STATUS")     # MySQL anterior a 8.0.22
+        estado = cursor.fetchone()
+        cursor.close()
+        if not estado:
+            return False
+        lag = estado.get("Seconds_Behind_Source", estado.get("Seconds_Behind_Master"))
+        return lag is not None and lag <= REPLICA_LAG_MAXIMO
+    finally:
+        conn.close()
+
+def _replica_disponible():
+    if DB_REPLICA_CONFIG is None:
+        return False
+    ahora = time.time()
+    if ahora - _replica["verificado"] >= REPLICA_INTERVALO_VERIFICACION and _replica_lock.acquire(blocking=False):
+        # Un solo hilo verifica; los demás usan el último resultado
+        try:
+            try:
+                _replica["ok"] = _verificar_replica()
+            except Exception as e:
+                print("ERROR: Réplica no disponible, se usa el primario:", e)
+                _replica["ok"] = False
+            _replica["verificado"] = ahora
+        finally:
+            _replica_lock.release()
+    return _replica["ok"]
+
+def _escribio_en_request():
+    """Tras escribir, el resto del request lee del primario (lee sus propias escrituras)."""
+    return has_request_context() and g.get("uso_primario", False)
+
+def _marcar_escritura():
+    if has_request_context() and request.method not in ("GET", "HEAD", "OPTIONS"):
+        g.uso_primario = True
+
+# ======================================================
+# OBTENER CONEXIÓN
+# ======================================================
+def get_connection(deadline=True, lectura=False):
+    """
+    lectura=True: consultas de solo lectura; van a la réplica si está configurada,
+    al día y el request no ha escrito todavía. Si no, al primario.
+    deadline=True: dentro de un request con g.deadline, los SELECT de esta conexión
+    se cortan en el servidor (MAX_EXECUTION_TIME) cuando se acaba el tiempo del request.
+    """
+    restante = _tiempo_restante() if deadline else None
+    if restante is not None and restante <= 0:
+        raise TimeoutError("Deadline de la petición vencido antes de consultar la BD")
+
+    conn = None
+    if lectura and not _escribio_en_request() and _replica_disponible():
+        try:
+            conn = _conectar("replica", DB_REPLICA_CONFIG)
+        except Error as e:
+            print("ERROR: No se pudo conectar a la réplica, se usa el primario:", e)
+            _replica["ok"] = False
+    if conn is None:
+        if not lectura:
+            _marcar_escritura()
+        try:
+            conn = _conectar("primario", DB_CONFIG)
+        except Error as e:
+            print("ERROR: No se pudo conectar a la BD:", e)
+            raise
+
+    # Se fija en cada entrega (0 = sin límite, para conexiones sin deadline): el pool
+    # puede haber reconectado o reiniciado la sesión, y con ella el valor anterior.
+    limite_ms = max(int(restante * 1000), 1) if restante is not None else 0
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SET SESSION MAX_EXECUTION_TIME = %s", (limite_ms,))
+        cursor.close()
+    except Exception:
+        conn.close()    # nadie más tiene la conexión: se devuelve antes de propagar
         raise
+    return conn
+
+def _tiempo_restante():
+    if not has_request_context():
+        return None
+    limite = getattr(g, "deadline", None)
+    return None if limite is None else limite - time.time()
+
+# ======================================================
+# TABLAS AUXILIARES (se crean una sola vez por proceso)
+# ======================================================
+_esquemas_listos = set()
+_esquemas_lock = threading.Lock()
+
+def ensure_schema(nombre, sentencias):
+    """Ejecuta los CREATE TABLE IF NOT EXISTS de un servicio la primera vez que se usa."""
+    if nombre in _esquemas_listos:
+        return
+    with _esquemas_lock:
+        if nombre in _esquemas_listos:
+            return
+        conn = get_connection(deadline=False)
+        try:
+            cursor = conn.cursor()
+            for sentencia in sentencias:
+                cursor.execute(sentencia)
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+        _esquemas_listos.add(nombre)
+
+# ======================================================
+# COMPARACIÓN DE CÓDIGOS COMO LA HACE MYSQL
+# ======================================================
+def clave_codigo(valor):
+    """
+    Clave para cruzar en Python códigos buscados con WHERE codigo IN (...): la
+    collation _ci no distingue mayúsculas, acentos ni espacios al final, y una
+    columna numérica convierte '007' en 7.
+    """
+    texto = unicodedata.normalize("NFKD", str(valor)).strip()
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).casefold()
+    return str(int(texto)) if texto.lstrip("+-").isdecimal() else texto
@@ -1,7 +1,13 @@
 # estudiantes.py
 from flask import Blueprint, request, jsonify
-from db import get_connection
+from db import get_connection, ensure_schema, clave_codigo
+from consultas import ejecutar
+from coalescer import coalescer
 from logger import log_event
+from academico import ESQUEMA_CREDITOS
+from promedios import actualizar_grupo, borrar_promedios
+from eventos import registrar_evento
+from archivado import borrar_dependientes_estudiante
 import time
 
 # ======================================================
@@ -9,17 +15,16 @@ import time
 # ======================================================
 estudiantes_bp = Blueprint("estudiantes", __name__)
 SERVICE = "continental.edu.pe/soa/estudiantes-service"
+MAX_CODIGOS_LOTE = 5000
 
 # ======================================================
 # LISTAR ESTUDIANTES (GET)
 # ======================================================
 @estudiantes_bp.route("/", methods=["GET"])
+@coalescer
 def listar_estudiantes():
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM estudiantes")
-    data = cursor.fetchall()
-    cursor.close()
+    conn = get_connection(lectura=True)
+    data = ejecutar(conn, "estudiantes.listar")
     conn.close()
     return jsonify({"status": "success", "data": data})
 
@@ -31,14 +36,8 @@ def get_estudiante_por_codigo(codigo):
     inicio = time.time()
     conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT id, codigo, nombre, carrera, ciclo, correo, estado
-            FROM estudiantes
-            WHERE codigo =%s
-        """, (codigo,))
-        est = cursor.fetchone()
+        conn = get_connection(lectura=True)
+        est = ejecutar(conn, "estudiantes.por_codigo", (codigo,), uno=True)
 
         if not est:
             log_event(SERVICE, "WARNING", "GET",
@@ -52,6 +51,54 @@ def get_estudiante_por_codigo(codigo):
         log_event(SERVICE, "ERROR", "GET",
                     f"Error al consultar estudiante {codigo}: {e}", inicio)
         return jsonify({"status": "error", "message": "Error en búsqueda por código"}), 500
+    finally:
+        if conn:
+            conn.close()
+
+# ======================================================
+# CONSULTA MASIVA POR CÓDIGOS (POST)
+# ======================================================
+@estudiantes_bp.route("/codigos", methods=["POST"])
+def get_estudiantes_por_codigos():
+    inicio = time.time()
+    data = request.get_json() or {}
+    codigos = data.get("codigos")
+
+    if not isinstance(codigos, list) or not codigos:
+        log_event(SERVICE, "WARNING", "POST",
+                    "Consulta masiva sin lista de códigos", inicio)
+        return jsonify({"status": "error", "message": "Debe enviar una lista 'codigos'"}), 400
+
+    # Quitar duplicados conservando el orden de llegada
+    codigos = list(dict.fromkeys(str(c) for c in codigos))
+    if len(codigos) > MAX_CODIGOS_LOTE:
+        log_event(SERVICE, "WARNING", "POST",
+                    f"Consulta masiva excede el límite: {len(codigos)} códigos", inicio)
+        return jsonify({"status": "error",
+                        "message": f"Máximo {MAX_CODIGOS_LOTE} códigos por consulta"}), 400
+
+    conn = None
+    try:
+        conn = get_connection(lectura=True)
+        cursor = conn.cursor(dictionary=True)
+        marcadores = ", ".join(["%s"] * len(codigos))
+        cursor.execute(f"""
+            SELECT id, codigo, nombre, carrera, ciclo, correo, estado
+            FROM estudiantes
+            WHERE codigo IN ({marcadores})
+        """, codigos)
+        data = cursor.fetchall()
+
+        encontrados = {clave_codigo(est["codigo"]) for est in data}
+        faltantes = [c for c in codigos if clave_codigo(c) not in encontrados]
+
+        log_event(SERVICE, "INFO", "POST",
+                    f"Consulta masiva de {len(codigos)} estudiantes ({len(faltantes)} no encontrados)", inicio)
+        return jsonify({"status": "success", "data": data, "faltantes": faltantes}), 200
+    except Exception as e:
+        log_event(SERVICE, "ERROR", "POST",
+                    f"Error en consulta masiva de estudiantes: {e}", inicio)
+        return jsonify({"status": "error", "message": "Error en búsqueda por códigos"}), 500
     finally:
         if conn:
             cursor.close()
@@ -83,8 +130,7 @@ def agregar_estudiante():
         cursor = conn.cursor()
 
         # Validar duplicado de código
-        cursor.execute("SELECT COUNT(*) FROM estudiantes WHERE codigo=%s", (codigo,))
-        if cursor.fetchone()[0] > 0:
+        if ejecutar(conn, "estudiantes.existe_codigo", (codigo,), uno=True)["existe"] > 0:
             log_event(SERVICE, "WARNING", "POST",
                         f"Código duplicado: {codigo}", inicio)
             return jsonify({"status": "error", "message": f"Código duplicado: {codigo}"}), 400
@@ -93,6 +139,10 @@ def agregar_estudiante():
             INSERT INTO estudiantes (codigo, nombre, correo, carrera, ciclo, estado)
             VALUES (%s, %s, %s, %s, %s, %s)
         """, (codigo, nombre, correo, carrera, ciclo, estado))
+        registrar_evento(conn, "estudiante.creado", "estudiante", cursor.lastrowid, {
+            "codigo": codigo, "nombre": nombre, "correo": correo,
+            "carrera": carrera, "ciclo": ciclo, "estado": estado
+        })
         conn.commit()
 
         log_event(SERVICE, "INFO", "POST",
@@ -138,6 +188,12 @@ def update_estudiante(id):
             SET codigo=%s, nombre=%s, correo=%s, carrera=%s, ciclo=%s, estado=%s
             WHERE id=%s
         """, (codigo, nombre, correo, carrera, ciclo, estado, id))
+        if carrera != estudiante["carrera"] or str(ciclo) != str(estudiante["ciclo"]):
+            actualizar_grupo(conn, id, carrera, ciclo)
+        registrar_evento(conn, "estudiante.actualizado", "estudiante", id, {
+            "codigo": codigo, "nombre": nombre, "correo": correo,
+            "carrera": carrera, "ciclo": ciclo, "estado": estado
+        })
         conn.commit()
 
         log_event(SERVICE, "INFO", "PUT",
@@ -161,10 +217,19 @@ def delete_estudiante(id):
     try:
         conn = get_connection()
         cursor = conn.cursor()
+        # Evaluaciones y matrículas primero, en lotes cortos (no un gran borrado en cascada)
+        borrar_dependientes_estudiante(conn, id)
+
         cursor.execute("DELETE FROM estudiantes WHERE id=%s", (id,))
+        eliminados = cursor.rowcount
+        if eliminados:
+            ensure_schema("creditos_ciclo", ESQUEMA_CREDITOS)
+            cursor.execute("DELETE FROM creditos_ciclo WHERE estudiante_id=%s", (id,))
+            borrar_promedios(conn, id)
+            registrar_evento(conn, "estudiante.eliminado", "estudiante", id, {})
         conn.commit()
 
-        if cursor.rowcount == 0:
+        if eliminados == 0:
             log_event(SERVICE, "WARNING", "DELETE",
                         f"Estudiante ID {id} no encontrado", inicio)
             return jsonify({"status": "error", "message": "Estudiante no encontrado"}), 404
@@ -1,32 +1,28 @@
 # evaluaciones.py
 from flask import Blueprint, request, jsonify, render_template
-from db import get_connection
+from db import get_connection, clave_codigo
+from consultas import ejecutar
+from coalescer import coalescer
 from logger import log_event
+from promedios import registrar_nota
+from eventos import registrar_evento, registrar_eventos
 import time
 
 evaluaciones_bp = Blueprint("evaluaciones", __name__)
 SERVICE = "continental.edu.pe/soa/evaluaciones-service"
+MAX_LOTE = 5000
 
 # ===========================
 # LISTAR EVALUACIONES (GET)
 # ===========================
 @evaluaciones_bp.route("/", methods=["GET"])
+@coalescer
 def listar_evaluaciones():
     inicio = time.time()
     conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("""
-            SELECT e.id AS id_estudiante, e.nombre AS estudiante,
-                   c.id AS id_curso, c.nombre AS curso,
-                   ev.nota
-            FROM evaluaciones ev
-            JOIN estudiantes e ON ev.id_estudiante = e.id
-            JOIN cursos c ON ev.id_curso = c.id
-        """)
-        data = cursor.fetchall()
+        conn = get_connection(lectura=True)
+        data = ejecutar(conn, "evaluaciones.listar")
 
         log_event(SERVICE, "INFO", "GET", "Listado de evaluaciones obtenido", inicio)
         return jsonify({"status": "success", "data": data}), 200
@@ -35,7 +31,6 @@ def listar_evaluaciones():
         return jsonify({"status": "error", "message": "Error al listar evaluaciones"}), 500
     finally:
         if conn:
-            cursor.close()
             conn.close()
 
 # ===========================
@@ -46,15 +41,8 @@ def cursos_matriculados(codigo_estudiante):
     inicio = time.time()
     conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        cursor.execute("""
-            SELECT curso, codigo_curso 
-            FROM vista_matriculas
-            WHERE codigo_estudiante=%s
-        """, (codigo_estudiante,))
-        cursos = cursor.fetchall()
+        conn = get_connection(lectura=True)
+        cursos = ejecutar(conn, "evaluaciones.cursos_de_estudiante", (codigo_estudiante,))
 
         log_event(SERVICE, "INFO", "GET", f"Cursos matriculados de {codigo_estudiante}", inicio)
         return jsonify({"status": "success", "data": cursos}), 200
@@ -63,7 +51,6 @@ def cursos_matriculados(codigo_estudiante):
         return jsonify({"status": "error", "message": "Error al obtener cursos"}), 500
     finally:
         if conn:
-            cursor.close()
             conn.close()
 
 # ===========================
@@ -81,28 +68,130 @@ def agregar_evaluacion():
         log_event(SERVICE, "WARNING", "POST", "Datos incompletos para evaluación", inicio)
         return jsonify({"status": "error", "message": "Faltan datos obligatorios"}), 400
 
+    try:
+        nota = float(nota)
+    except (TypeError, ValueError):
+        log_event(SERVICE, "WARNING", "POST", f"Nota inválida: {nota}", inicio)
+        return jsonify({"status": "error", "message": "Nota inválida"}), 400
+
     conn = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
 
-        # Insertar evaluación usando IDs reales
+        # Resolver IDs reales
+        estudiante = ejecutar(conn, "estudiantes.id_por_codigo", (codigo_estudiante,), uno=True)
+        curso = ejecutar(conn, "cursos.id_por_codigo", (codigo_curso,), uno=True)
+        if not estudiante or not curso:
+            log_event(SERVICE, "WARNING", "POST",
+                      f"Estudiante o curso inexistente: {codigo_estudiante} - {codigo_curso}", inicio)
+            return jsonify({"status": "error", "message": "Estudiante o curso no encontrado"}), 404
+
         cursor.execute("""
             INSERT INTO evaluaciones (id_estudiante, id_curso, nota)
-            VALUES (
-                (SELECT id FROM estudiantes WHERE codigo=%s),
-                (SELECT id FROM cursos WHERE codigo=%s),
-                %s
-            )
-        """, (codigo_estudiante, codigo_curso, nota))
+            VALUES (%s, %s, %s)
+        """, (estudiante["id"], curso["id"], nota))
+        evaluacion_id = cursor.lastrowid
+        # Promedios ponderados y evento del outbox en la misma transacción
+        registrar_nota(conn, estudiante["id"], curso["id"], nota)
+        registrar_evento(conn, "evaluacion.creada", "evaluacion", evaluacion_id, {
+            "codigo_estudiante": codigo_estudiante, "codigo_curso": codigo_curso, "nota": nota
+        })
         conn.commit()
 
         log_event(SERVICE, "INFO", "POST", f"Evaluación registrada: {codigo_estudiante} - {codigo_curso}", inicio)
         return jsonify({"status": "success", "message": "Evaluación registrada correctamente"}), 201
     except Exception as e:
+        if conn:
+            conn.rollback()
         log_event(SERVICE, "ERROR", "POST", f"Error al registrar evaluación: {e}", inicio)
         return jsonify({"status": "error", "message": f"Error al registrar evaluación: {e}"}), 500
     finally:
         if conn:
             cursor.close()
             conn.close()
+
+# ===========================
+# CARGA MASIVA DE EVALUACIONES (POST)
+# ===========================
+@evaluaciones_bp.route("/lote", methods=["POST"])
+def agregar_evaluaciones_lote():
+    inicio = time.time()
+    data = request.get_json() or {}
+    evaluaciones = data.get("evaluaciones")
+
+    if not isinstance(evaluaciones, list) or not evaluaciones:
+        log_event(SERVICE, "WARNING", "POST", "Carga masiva sin evaluaciones", inicio)
+        return jsonify({"status": "error", "message": "Debe enviar una lista 'evaluaciones'"}), 400
+    if len(evaluaciones) > MAX_LOTE:
+        log_event(SERVICE, "WARNING", "POST", f"Carga masiva excede el límite: {len(evaluaciones)}", inicio)
+        return jsonify({"status": "error", "message": f"Máximo {MAX_LOTE} evaluaciones por carga"}), 400
+
+    try:
+        filas = [(str(ev["codigo_estudiante"]), str(ev["codigo_curso"]), float(ev["nota"]))
+                 for ev in evaluaciones]
+    except (KeyError, TypeError, ValueError):
+        log_event(SERVICE, "WARNING", "POST", "Carga masiva con datos incompletos o notas inválidas", inicio)
+        return jsonify({"status": "error", "message": "Cada evaluación requiere codigo_estudiante, codigo_curso y nota"}), 400
+
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+
+        # Resolver todos los códigos con dos consultas IN (...)
+        ids = {}
+        for tabla, posicion in (("estudiantes", 0), ("cursos", 1)):
+            codigos = list({f[posicion] for f in filas})
+            marcadores = ", ".join(["%s"] * len(codigos))
+            cursor.execute(f"SELECT codigo, id FROM {tabla} WHERE codigo IN ({marcadores})", codigos)
+            # Claves como compara MySQL (mayúsculas, espacios finales, ceros a la izquierda)
+            ids[tabla] = {clave_codigo(codigo): id_ for codigo, id_ in cursor.fetchall()}
+
+        faltantes = sorted({f[0] for f in filas if clave_codigo(f[0]) not in ids["estudiantes"]} |
+                           {f[1] for f in filas if clave_codigo(f[1]) not in ids["cursos"]})
+        if faltantes:
+            log_event(SERVICE, "WARNING", "POST", f"Carga masiva con códigos inexistentes: {faltantes[:20]}", inicio)
+            return jsonify({"status": "error", "message": "Códigos no encontrados", "faltantes": faltantes}), 400
+
+        registros = [(ids["estudiantes"][clave_codigo(est)], ids["cursos"][clave_codigo(cur)], nota)
+                     for est, cur, nota in filas]
+        cursor.executemany("""
+            INSERT INTO evaluaciones (id_estudiante, id_curso, nota)
+            VALUES (%s, %s, %s)
+        """, registros)
+        # Los ids del lote no son necesariamente consecutivos (innodb_autoinc_lock_mode=2),
+        # pero sí crecientes en el orden de las filas. Se leen de vuelta: la foto de la
+        # transacción se tomó antes del INSERT, así que desde el primer id solo se ven
+        # las filas propias (las de otros requests se confirmaron después de la foto).
+        cursor.execute("""
+            SELECT id, id_estudiante, id_curso FROM evaluaciones
+            WHERE id >= %s ORDER BY id LIMIT %s
+        """, (cursor.lastrowid, len(registros)))
+        leidas = cursor.fetchall()
+        if [(e, c) for _, e, c in leidas] != [(e, c) for e, c, _ in registros]:
+            raise RuntimeError("Los ids leídos no corresponden a la carga masiva")
+        evaluacion_ids = [fila[0] for fila in leidas]
+        eventos = []
+        for evaluacion_id, (estudiante_id, curso_id, nota), (codigo_estudiante, codigo_curso, _) in zip(
+                evaluacion_ids, registros, filas):
+            registrar_nota(conn, estudiante_id, curso_id, nota)
+            eventos.append(("evaluacion.creada", "evaluacion", evaluacion_id, {
+                "estudiante_id": estudiante_id, "curso_id": curso_id,
+                "codigo_estudiante": codigo_estudiante, "codigo_curso": codigo_curso, "nota": nota
+            }))
+        # Eventos del lote en un solo INSERT justo antes del commit
+        registrar_eventos(conn, eventos)
+        conn.commit()
+
+        log_event(SERVICE, "INFO", "POST", f"Carga masiva de {len(registros)} evaluaciones registrada", inicio)
+        return jsonify({"status": "success", "message": f"{len(registros)} evaluaciones registradas"}), 201
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        log_event(SERVICE, "ERROR", "POST", f"Error en carga masiva de evaluaciones: {e}", inicio)
+        return jsonify({"status": "error", "message": f"Error al registrar evaluaciones: {e}"}), 500
+    finally:
+        if conn:
+            cursor.close()
+            conn.close()
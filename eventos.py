@@ -0,0 +1,226 @@
+# eventos.py
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from db import get_connection, ensure_schema
+from logger import log_event
+import json, time
+
+eventos_bp = Blueprint("eventos", __name__)
+SERVICE = "continental.edu.pe/soa/eventos-service"
+
+MAX_LIMITE = 1000
+INTERVALO_SSE = 1.0         # segundos entre consultas cuando no hay eventos nuevos
+LATIDO_SSE = 15             # comentario keep-alive
+DURACION_MAXIMA_SSE = 300   # luego el cliente reconecta con Last-Event-ID
+LOTE_PUBLICACION = 1000
+
+# El id AUTO_INCREMENT se asigna al insertar, pero el evento se confirma al hacer
+# commit: una transacción larga (p. ej. una carga masiva) confirma ids menores que
+# otros ya entregados. Por eso los consumidores no leen por id sino por 'secuencia',
+# que el publicador asigna después del commit, en orden, a los eventos ya confirmados.
+ESQUEMA_EVENTOS = [
+    """
+    CREATE TABLE IF NOT EXISTS outbox_eventos (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        tipo VARCHAR(50) NOT NULL,
+        entidad VARCHAR(30) NOT NULL,
+        entidad_id VARCHAR(50) NULL,
+        payload TEXT NOT NULL,
+        creado_en DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+        secuencia BIGINT NULL,
+        UNIQUE KEY uq_secuencia (secuencia),
+        INDEX idx_entidad (entidad, id),
+        INDEX idx_entidad_secuencia (entidad, secuencia)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS outbox_secuencia (
+        id TINYINT PRIMARY KEY,
+        ultima BIGINT NOT NULL
+    )
+    """,
+    "INSERT IGNORE INTO outbox_secuencia (id, ultima) VALUES (1, 0)",
+]
+
+# Tablas creadas antes de la columna secuencia
+MIGRACION_SECUENCIA = """
+    ALTER TABLE outbox_eventos
+        ADD COLUMN secuencia BIGINT NULL,
+        ADD UNIQUE KEY uq_secuencia (secuencia),
+        ADD INDEX idx_entidad_secuencia (entidad, secuencia)
+"""
+_migrado = False
+
+def _asegurar_outbox():
+    global _migrado
+    ensure_schema("outbox_eventos", ESQUEMA_EVENTOS)
+    if _migrado:
+        return
+    conn = get_connection(deadline=False)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'outbox_eventos' AND COLUMN_NAME = 'secuencia'
+        """)
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(MIGRACION_SECUENCIA)
+        _migrado = True
+    finally:
+        cursor.close()
+        conn.close()
+
+# ======================================================
+# ESCRITURA EN EL OUTBOX (misma transacción que el cambio)
+# ======================================================
+def registrar_evento(conn, tipo, entidad, entidad_id, datos):
+    """
+    Inserta el evento usando la conexión del handler, sin hacer commit:
+    el evento se confirma o se descarta junto con el cambio que describe.
+    """
+    registrar_eventos(conn, [(tipo, entidad, entidad_id, datos)])
+
+def registrar_eventos(conn, eventos):
+    """Varios eventos (tipo, entidad, entidad_id, datos) en un solo INSERT, sin commit."""
+    ensure_schema("outbox_eventos", ESQUEMA_EVENTOS)
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("""
+            INSERT INTO outbox_eventos (tipo, entidad, entidad_id, payload)
+            VALUES (%s, %s, %s, %s)
+        """, [(tipo, entidad, None if entidad_id is None else str(entidad_id), json.dumps(datos, default=str))
+              for tipo, entidad, entidad_id, datos in eventos])
+    finally:
+        cursor.close()
+
+# ======================================================
+# PUBLICADOR: numera los eventos confirmados (después del commit)
+# ======================================================
+def publicar_pendientes():
+    """
+    Asigna 'secuencia' a los eventos confirmados que aún no la tienen, en orden de
+    id. La fila de outbox_secuencia se bloquea antes de la primera lectura, así que
+    los publicadores van de uno en uno y cada uno ve todo lo confirmado hasta ese
+    momento: un evento que se confirma después recibe siempre una secuencia mayor.
+    """
+    _asegurar_outbox()
+    conn = get_connection(deadline=False)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT 1 FROM outbox_eventos WHERE secuencia IS NULL LIMIT 1")
+        pendiente = cursor.fetchone()
+        conn.rollback()     # la lectura de arriba no debe fijar la foto de la transacción
+        if not pendiente:
+            return
+
+        cursor.execute("SELECT ultima FROM outbox_secuencia WHERE id = 1 FOR UPDATE")
+        ultima = cursor.fetchone()[0]
+        cursor.execute("SELECT id FROM outbox_eventos WHERE secuencia IS NULL ORDER BY id LIMIT %s",
+                       (LOTE_PUBLICACION,))
+        ids = [fila[0] for fila in cursor.fetchall()]
+        if ids:
+            cursor.executemany("UPDATE outbox_eventos SET secuencia=%s WHERE id=%s",
+                               [(ultima + i, evento_id) for i, evento_id in enumerate(ids, start=1)])
+            cursor.execute("UPDATE outbox_secuencia SET ultima=%s WHERE id = 1", (ultima + len(ids),))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def leer_eventos(desde, limite, entidad=None):
+    """Eventos con secuencia > desde, en orden de confirmación. 'id' es la secuencia."""
+    publicar_pendientes()
+    # El stream SSE vive más que el deadline del request; cada consulta es corta
+    conn = get_connection(deadline=False)
+    cursor = conn.cursor(dictionary=True)
+    try:
+        sql = """
+            SELECT secuencia AS id, id AS evento_id, tipo, entidad, entidad_id, payload, creado_en
+            FROM outbox_eventos
+            WHERE secuencia > %s
+        """
+        params = [desde]
+        if entidad:
+            sql += " AND entidad = %s"
+            params.append(entidad)
+        sql += " ORDER BY secuencia ASC LIMIT %s"
+        params.append(limite)
+        cursor.execute(sql, params)
+        eventos = cursor.fetchall()
+        for ev in eventos:
+            ev["payload"] = json.loads(ev["payload"])
+            ev["creado_en"] = ev["creado_en"].isoformat()
+        return eventos
+    finally:
+        cursor.close()
+        conn.close()
+
+def _parametros_feed():
+    desde = request.headers.get("Last-Event-ID") or request.args.get("desde", 0)
+    limite = min(max(int(request.args.get("limite", 500)), 1), MAX_LIMITE)
+    return int(desde), limite, request.args.get("entidad")
+
+# ======================================================
+# FEED DE CAMBIOS POR CURSOR (GET)
+# ?desde=<ultima secuencia recibida>&limite=500&entidad=matricula
+# ======================================================
+@eventos_bp.route("/cambios", methods=["GET"])
+def feed_cambios():
+    inicio = time.time()
+    try:
+        desde, limite, entidad = _parametros_feed()
+    except ValueError:
+        log_event(SERVICE, "WARNING", "GET", f"Parámetros de feed inválidos: {request.args}", inicio)
+        return jsonify({"status": "error", "message": "Parámetros inválidos"}), 400
+
+    try:
+        eventos = leer_eventos(desde, limite, entidad)
+        ultimo = eventos[-1]["id"] if eventos else desde
+        log_event(SERVICE, "INFO", "GET", f"Feed de cambios desde {desde}: {len(eventos)} eventos", inicio)
+        return jsonify({"status": "success", "data": eventos, "ultimo": ultimo,
+                        "hay_mas": len(eventos) == limite}), 200
+    except Exception as e:
+        log_event(SERVICE, "ERROR", "GET", f"Error al leer feed de cambios: {e}", inicio)
+        return jsonify({"status": "error", "message": "Error al leer cambios"}), 500
+
+# ======================================================
+# STREAM SERVER-SENT EVENTS (GET)
+# ======================================================
+@eventos_bp.route("/stream", methods=["GET"])
+def stream_cambios():
+    inicio = time.time()
+    try:
+        desde, limite, entidad = _parametros_feed()
+    except ValueError:
+        log_event(SERVICE, "WARNING", "GET", f"Parámetros de stream inválidos: {request.args}", inicio)
+        return jsonify({"status": "error", "message": "Parámetros inválidos"}), 400
+
+    log_event(SERVICE, "INFO", "GET", f"Suscripción SSE desde {desde}", inicio)
+
+    def generar(ultimo):
+        # La conexión se abre y cierra en cada consulta: el stream no retiene una conexión
+        yield f"retry: {int(INTERVALO_SSE * 1000)}\n\n"
+        ultimo_envio = time.time()
+        while time.time() - inicio < DURACION_MAXIMA_SSE:
+            try:
+                eventos = leer_eventos(ultimo, limite, entidad)
+            except Exception as e:
+                log_event(SERVICE, "ERROR", "GET", f"Error en stream SSE: {e}", inicio)
+                return
+            for ev in eventos:
+                ultimo = ev["id"]
+                yield f"id: {ev['id']}\nevent: {ev['tipo']}\ndata: {json.dumps(ev, default=str)}\n\n"
+                ultimo_envio = time.time()
+            if len(eventos) < limite:
+                if time.time() - ultimo_envio >= LATIDO_SSE:
+                    yield ": latido\n\n"
+                    ultimo_envio = time.time()
+                time.sleep(INTERVALO_SSE)
+
+    return Response(
+        stream_with_context(generar(desde)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
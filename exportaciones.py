@@ -0,0 +1,179 @@
+# exportaciones.py
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from db import get_connection, cerrar_sin_buffer
+from logger import log_event
+import argparse, csv, io, sys, time
+
+exportaciones_bp = Blueprint("exportaciones", __name__)
+SERVICE = "continental.edu.pe/soa/exportaciones-service"
+
+# Filas leídas del cursor por cada escritura al cliente/archivo
+TAMANO_LOTE = 5000
+
+# ======================================================
+# CONSULTAS DE EXPORTACIÓN
+# ======================================================
+CONSULTAS = {
+    "matriculas": {
+        "columnas": ["id", "codigo_estudiante", "estudiante", "carrera", "ciclo_estudiante",
+                     "codigo_curso", "curso", "creditos", "ciclo_curso", "fecha", "estado"],
+        "sql": """
+            SELECT m.id, e.codigo, e.nombre, e.carrera, e.ciclo,
+                   c.codigo, c.nombre, c.creditos, c.ciclo, m.fecha, m.estado
+            FROM matriculas m
+            JOIN estudiantes e ON m.estudiante_id = e.id
+            JOIN cursos c ON m.curso_id = c.id
+        """,
+        "filtros": {"ciclo": "c.ciclo = %s", "carrera": "e.carrera = %s",
+                    "desde": "m.fecha >= %s", "hasta": "m.fecha < %s"},
+        "orden": "m.id",
+    },
+    "evaluaciones": {
+        "columnas": ["id", "codigo_estudiante", "estudiante", "carrera",
+                     "codigo_curso", "curso", "creditos", "ciclo_curso", "nota"],
+        "sql": """
+            SELECT ev.id, e.codigo, e.nombre, e.carrera,
+                   c.codigo, c.nombre, c.creditos, c.ciclo, ev.nota
+            FROM evaluaciones ev
+            JOIN estudiantes e ON ev.id_estudiante = e.id
+            JOIN cursos c ON ev.id_curso = c.id
+        """,
+        "filtros": {"ciclo": "c.ciclo = %s", "carrera": "e.carrera = %s"},
+        "orden": "ev.id",
+    },
+    "estudiantes": {
+        "columnas": ["id", "codigo", "nombre", "correo", "carrera", "ciclo", "estado"],
+        "sql": """
+            SELECT e.id, e.codigo, e.nombre, e.correo, e.carrera, e.ciclo, e.estado
+            FROM estudiantes e
+        """,
+        "filtros": {"ciclo": "e.ciclo = %s", "carrera": "e.carrera = %s"},
+        "orden": "e.id",
+    },
+}
+
+def construir_consulta(tipo, filtros):
+    """Arma el SELECT de la exportación con los filtros soportados por el tipo."""
+    definicion = CONSULTAS[tipo]
+    condiciones, params = [], []
+    for nombre, condicion in definicion["filtros"].items():
+        valor = filtros.get(nombre)
+        if valor not in (None, ""):
+            condiciones.append(condicion)
+            params.append(valor)
+    sql = definicion["sql"]
+    if condiciones:
+        sql += " WHERE " + " AND ".join(condiciones)
+    sql += f" ORDER BY {definicion['orden']}"
+    return sql, params
+
+def abrir_consulta(tipo, filtros):
+    """
+    Conexión y cursor sin buffer con el SELECT ya ejecutado: los errores de
+    conexión o de la consulta salen aquí, antes de empezar a responder.
+    """
+    sql, params = construir_consulta(tipo, filtros)
+    # Exportación larga por naturaleza: no se corta con el deadline del request
+    conn = get_connection(deadline=False, lectura=True)
+    cursor = None
+    try:
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(sql, params)
+    except Exception:
+        cerrar_sin_buffer(conn, cursor)
+        raise
+    return conn, cursor
+
+def bloques_csv(tipo, cursor, tamano_lote=TAMANO_LOTE):
+    """
+    Genera el CSV por bloques de texto. Las filas se leen del servidor a medida
+    que se consumen y solo se mantiene en memoria un lote a la vez, por lo que
+    el consumo no depende del número de filas. Devuelve (return) las filas escritas.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CONSULTAS[tipo]["columnas"])
+    total = 0
+    while True:
+        filas = cursor.fetchmany(tamano_lote)
+        if not filas:
+            break
+        writer.writerows(filas)
+        total += len(filas)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
+    return total
+
+def generar_csv(tipo, filtros, tamano_lote=TAMANO_LOTE):
+    """abrir_consulta + bloques_csv, cerrando la conexión al terminar (línea de comandos)."""
+    conn, cursor = abrir_consulta(tipo, filtros)
+    try:
+        yield from bloques_csv(tipo, cursor, tamano_lote)
+    finally:
+        cerrar_sin_buffer(conn, cursor)
+
+# ======================================================
+# ENDPOINTS DE EXPORTACIÓN (GET)
+# ======================================================
+@exportaciones_bp.route("/<string:tipo>.csv", methods=["GET"])
+def exportar_csv(tipo):
+    inicio = time.time()
+    if tipo not in CONSULTAS:
+        log_event(SERVICE, "WARNING", "GET", f"Exportación desconocida: {tipo}", inicio)
+        return jsonify({"status": "error", "message": f"Exportación no soportada: {tipo}"}), 404
+
+    filtros = {k: request.args.get(k) for k in CONSULTAS[tipo]["filtros"]}
+    try:
+        conn, cursor = abrir_consulta(tipo, filtros)
+    except Exception as e:
+        log_event(SERVICE, "ERROR", "GET", f"Error al iniciar exportación CSV de {tipo}: {e}", inicio)
+        return jsonify({"status": "error", "message": "Error al generar la exportación"}), 500
+    log_event(SERVICE, "INFO", "GET", f"Exportación CSV de {tipo} iniciada {filtros}", inicio)
+
+    def generar():
+        try:
+            total = yield from bloques_csv(tipo, cursor)
+            log_event(SERVICE, "INFO", "GET", f"Exportación CSV de {tipo} terminada: {total} filas", inicio)
+        except Exception as e:
+            # La respuesta ya empezó: el CSV queda cortado y el error en el log
+            log_event(SERVICE, "ERROR", "GET", f"Exportación CSV de {tipo} interrumpida: {e}", inicio)
+
+    nombre = f"{tipo}.csv"
+    respuesta = Response(
+        stream_with_context(generar()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={nombre}"}
+    )
+    # Se cierra al terminar la respuesta, aunque el cliente corte la descarga
+    respuesta.call_on_close(lambda: cerrar_sin_buffer(conn, cursor))
+    return respuesta
+
+# ======================================================
+# LÍNEA DE COMANDOS
+# python exportaciones.py matriculas --ciclo 3 --salida matriculas.csv
+# ======================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta matrículas, evaluaciones o estudiantes a CSV")
+    parser.add_argument("tipo", choices=sorted(CONSULTAS))
+    parser.add_argument("--ciclo")
+    parser.add_argument("--carrera")
+    parser.add_argument("--desde", help="Fecha inicial (YYYY-MM-DD), solo matrículas")
+    parser.add_argument("--hasta", help="Fecha final exclusiva (YYYY-MM-DD), solo matrículas")
+    parser.add_argument("--salida", help="Archivo destino (por defecto la salida estándar)")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE)
+    args = parser.parse_args(argv)
+
+    filtros = {"ciclo": args.ciclo, "carrera": args.carrera, "desde": args.desde, "hasta": args.hasta}
+    destino = open(args.salida, "w", encoding="utf-8", newline="") if args.salida else sys.stdout
+    try:
+        for bloque in generar_csv(args.tipo, filtros, args.lote):
+            destino.write(bloque)
+    finally:
+        if destino is not sys.stdout:
+            destino.close()
+
+if __name__ == "__main__":
+    main()
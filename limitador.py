@@ -0,0 +1,128 @@
+# limitador.py
+from flask import g, request, jsonify
+from logger import _get_client_ip, _get_user
+from metricas import incrementar, registrar_proveedor
+import os, threading, time
+
+# ======================================================
+# CONFIGURACIÓN
+# clase de ruta -> (tokens por segundo, capacidad de ráfaga)
+# ======================================================
+TASAS = {
+    "escritura": (float(os.environ.get("LIMITE_ESCRITURA_TPS", "2")),
+                  float(os.environ.get("LIMITE_ESCRITURA_RAFAGA", "10"))),
+    # Una página de la interfaz pide varios listados seguidos: la ráfaga debe cubrirla
+    "listado": (float(os.environ.get("LIMITE_LISTADO_TPS", "5")),
+                float(os.environ.get("LIMITE_LISTADO_RAFAGA", "20"))),
+    "consulta": (float(os.environ.get("LIMITE_CONSULTA_TPS", "20")),
+                 float(os.environ.get("LIMITE_CONSULTA_RAFAGA", "50"))),
+}
+MAX_CONCURRENTES = int(os.environ.get("LIMITE_CONCURRENCIA", "32"))
+# Llamadas que la interfaz web hace en nombre del usuario (cliente_servicios): van
+# en buckets aparte de las llamadas directas del mismo cliente a la API
+HEADER_ORIGEN = "X-Origen"
+ORIGEN_INTERFAZ = "interfaz"
+
+# Endpoints que devuelven tablas completas o recorren mucho volumen
+ENDPOINTS_LISTADO = {
+    "estudiantes.listar_estudiantes",
+    "cursos.listar_cursos",
+    "matriculas.listar_matriculas",
+    "matriculas.matriculas_html",
+    "evaluaciones.listar_evaluaciones",
+    "exportaciones.exportar_csv",
+    "academico.obtener_historial_cohorte",
+    "promedios.ranking",
+    "eventos.feed_cambios",
+    "eventos.stream_cambios",
+}
+# Conexiones de larga duración: no ocupan un cupo de concurrencia
+ENDPOINTS_SIN_CUPO = {"eventos.stream_cambios"}
+
+MAX_CLIENTES = 10000
+INACTIVIDAD_PURGA = 600
+
+# ======================================================
+# TOKEN BUCKETS POR CLIENTE Y CLASE DE RUTA
+# ======================================================
+_buckets = {}           # (cliente, clase) -> [tokens, ultimo_acceso]
+_buckets_lock = threading.Lock()
+_cupos = threading.BoundedSemaphore(MAX_CONCURRENTES)
+
+def _clase_ruta():
+    if request.method not in ("GET", "HEAD", "OPTIONS"):
+        return "escritura"
+    if request.endpoint in ENDPOINTS_LISTADO:
+        return "listado"
+    return "consulta"
+
+def _cliente():
+    usuario = _get_user()
+    cliente = f"user:{usuario}" if usuario != "anon" else f"ip:{_get_client_ip()}"
+    if request.headers.get(HEADER_ORIGEN) == ORIGEN_INTERFAZ:
+        cliente += f"|{ORIGEN_INTERFAZ}"
+    return cliente
+
+def _purgar(ahora):
+    inactivos = [k for k, (_, ultimo) in _buckets.items() if ahora - ultimo > INACTIVIDAD_PURGA]
+    for k in inactivos:
+        del _buckets[k]
+
+def consumir(cliente, clase):
+    """Devuelve 0 si hay token disponible, o los segundos a esperar por el siguiente."""
+    tasa, capacidad = TASAS[clase]
+    ahora = time.monotonic()
+    with _buckets_lock:
+        if len(_buckets) > MAX_CLIENTES:
+            _purgar(ahora)
+        tokens, ultimo = _buckets.get((cliente, clase), (capacidad, ahora))
+        tokens = min(capacidad, tokens + (ahora - ultimo) * tasa)
+        if tokens >= 1:
+            _buckets[(cliente, clase)] = (tokens - 1, ahora)
+            return 0
+        _buckets[(cliente, clase)] = (tokens, ahora)
+        return (1 - tokens) / tasa if tasa > 0 else 60
+
+def _rechazo(codigo, mensaje, espera, metrica):
+    incrementar(metrica)
+    resp = jsonify({"status": "error", "message": mensaje})
+    resp.status_code = codigo
+    resp.headers["Retry-After"] = str(max(1, int(espera + 0.999)))
+    return resp
+
+# ======================================================
+# HOOKS DE FLASK
+# ======================================================
+def _antes_de_request():
+    if not request.path.startswith("/api/"):
+        return None
+
+    clase = _clase_ruta()
+    espera = consumir(_cliente(), clase)
+    if espera:
+        return _rechazo(429, "Demasiadas solicitudes, intente más tarde", espera,
+                        f"limitador.rechazos.{clase}")
+
+    # Se descarta carga antes de tomar una conexión a la BD
+    if request.endpoint not in ENDPOINTS_SIN_CUPO:
+        if not _cupos.acquire(blocking=False):
+            return _rechazo(503, "Servidor ocupado, intente más tarde", 1,
+                            "limitador.rechazos.concurrencia")
+        g.cupo_limitador = True
+    return None
+
+def _al_terminar(exc=None):
+    if g.pop("cupo_limitador", False):
+        _cupos.release()
+
+def _estado():
+    with _buckets_lock:
+        clientes = len(_buckets)
+    return {"clientes_activos": clientes, "max_concurrentes": MAX_CONCURRENTES,
+            "tasas": {k: {"por_segundo": v[0], "rafaga": v[1]} for k, v in TASAS.items()}}
+
+def instalar_limitador(app):
+    """Registrar antes que los demás before_request para que el rechazo sea lo más barato posible."""
+    app.before_request(_antes_de_request)
+    app.teardown_request(_al_terminar)
+    registrar_proveedor("limitador", _estado)
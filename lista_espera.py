@@ -0,0 +1,228 @@
+# lista_espera.py
+from db import ensure_schema
+from academico import reservar_creditos
+from eventos import registrar_evento
+from mysql.connector import errors
+from datetime import datetime
+import os
+
+# Cupo de los cursos sin fila en cursos_cupos (0 = sin tope, como hasta ahora)
+CUPO_DEFECTO = int(os.environ.get("CUPO_DEFECTO", "0"))
+
+ESQUEMA_LISTA_ESPERA = [
+    """
+    CREATE TABLE IF NOT EXISTS cursos_cupos (
+        curso_id INT PRIMARY KEY,
+        cupo INT NOT NULL,
+        matriculados INT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS lista_espera (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        curso_id INT NOT NULL,
+        estudiante_id INT NOT NULL,
+        prioridad INT NOT NULL DEFAULT 0,
+        creado_en DATETIME NOT NULL,
+        UNIQUE KEY uq_curso_estudiante (curso_id, estudiante_id),
+        INDEX idx_turno (curso_id, prioridad DESC, id),
+        INDEX idx_estudiante (estudiante_id)
+    )
+    """,
+]
+
+# ======================================================
+# CUPO DEL CURSO (fila bloqueada hasta el commit/rollback)
+# ======================================================
+def _bloquear_cupo(cursor, curso_id):
+    """
+    Devuelve [cupo, matriculados] con la fila del curso bloqueada, o None si el
+    curso no tiene tope. matriculados NULL (fila nueva o contador invalidado por
+    un borrado o un cierre de ciclo) se recalcula desde las matrículas activas.
+    """
+    if CUPO_DEFECTO > 0:
+        cursor.execute("""
+            INSERT INTO cursos_cupos (curso_id, cupo, matriculados) VALUES (%s, %s, NULL)
+            ON DUPLICATE KEY UPDATE cupo = cupo
+        """, (curso_id, CUPO_DEFECTO))
+    cursor.execute("SELECT cupo, matriculados FROM cursos_cupos WHERE curso_id=%s FOR UPDATE", (curso_id,))
+    fila = cursor.fetchone()
+    if fila is None:
+        return None
+    cupo, matriculados = fila
+    if matriculados is None:
+        cursor.execute("SELECT COUNT(*) FROM matriculas WHERE curso_id=%s AND estado='activo'", (curso_id,))
+        matriculados = cursor.fetchone()[0]
+        cursor.execute("UPDATE cursos_cupos SET matriculados=%s WHERE curso_id=%s", (matriculados, curso_id))
+    return [cupo, matriculados]
+
+def _guardar_matriculados(cursor, curso_id, matriculados):
+    cursor.execute("UPDATE cursos_cupos SET matriculados=%s WHERE curso_id=%s", (matriculados, curso_id))
+
+def _retirar(conn, espera_id, curso_id, estudiante_id, motivo):
+    registrar_evento(conn, "lista_espera.retirado", "lista_espera", espera_id, {
+        "curso_id": curso_id, "estudiante_id": estudiante_id, "motivo": motivo
+    })
+
+def _promover(conn, cursor, curso_id, info):
+    """
+    Ocupa los cupos libres con los primeros de la lista (prioridad, luego orden de
+    llegada). Quien ya está matriculado, excede el tope de créditos o ya no es
+    válido (estudiante borrado, matrícula rechazada por la BD) sale de la lista y
+    se pasa al siguiente. Devuelve los ids de los estudiantes promovidos.
+    """
+    promovidos = []
+    while info[1] < info[0]:
+        cursor.execute("""
+            SELECT id, estudiante_id FROM lista_espera
+            WHERE curso_id=%s ORDER BY prioridad DESC, id LIMIT 1 FOR UPDATE
+        """, (curso_id,))
+        turno = cursor.fetchone()
+        if not turno:
+            break
+        espera_id, estudiante_id = turno
+        cursor.execute("DELETE FROM lista_espera WHERE id=%s", (espera_id,))
+
+        cursor.execute("SELECT COUNT(*) FROM matriculas WHERE estudiante_id=%s AND curso_id=%s",
+                       (estudiante_id, curso_id))
+        if cursor.fetchone()[0] > 0:
+            continue
+        cursor.execute("SELECT COUNT(*) FROM estudiantes WHERE id=%s", (estudiante_id,))
+        if cursor.fetchone()[0] == 0:
+            _retirar(conn, espera_id, curso_id, estudiante_id, "estudiante_inexistente")
+            continue
+
+        # Si la BD rechaza la matrícula se deshace solo este turno (créditos incluidos)
+        cursor.execute("SAVEPOINT promocion")
+        try:
+            reserva = reservar_creditos(conn, estudiante_id, curso_id)
+            if reserva and reserva["ok"]:
+                cursor.execute("""
+                    INSERT INTO matriculas (estudiante_id, curso_id, fecha, estado)
+                    VALUES (%s, %s, %s, %s)
+                """, (estudiante_id, curso_id, datetime.now(), "activo"))
+        except (errors.IntegrityError, errors.DataError):
+            cursor.execute("ROLLBACK TO SAVEPOINT promocion")
+            _retirar(conn, espera_id, curso_id, estudiante_id, "matricula_invalida")
+            continue
+        if not reserva or not reserva["ok"]:
+            _retirar(conn, espera_id, curso_id, estudiante_id, "tope_creditos")
+            continue
+        registrar_evento(conn, "matricula.creada", "matricula", cursor.lastrowid, {
+            "estudiante_id": estudiante_id, "curso_id": curso_id, "ciclo": reserva["ciclo"],
+            "creditos": reserva["creditos"], "estado": "activo", "origen": "lista_espera"
+        })
+        info[1] += 1
+        promovidos.append(estudiante_id)
+    _guardar_matriculados(cursor, curso_id, info[1])
+    return promovidos
+
+# ======================================================
+# OPERACIONES USADAS POR MATRÍCULAS / ESTUDIANTES / CURSOS
+# ======================================================
+def ocupar_cupo(conn, curso_id):
+    """
+    Dentro de la transacción de la matrícula: toma un cupo del curso.
+    Si hay cupos libres y gente esperando, primero se promueve a la lista para que
+    nadie se salte la cola. No hace commit: las promociones se confirman con la
+    transacción del llamador y, si este hace rollback, se repiten en el próximo uso
+    del cupo. Devuelve None si el curso no tiene tope, o un dict con ok, cupo y
+    matriculados.
+    """
+    ensure_schema("lista_espera", ESQUEMA_LISTA_ESPERA)
+    cursor = conn.cursor()
+    try:
+        info = _bloquear_cupo(cursor, curso_id)
+        if info is None:
+            return None
+        if info[1] < info[0]:
+            cursor.execute("SELECT 1 FROM lista_espera WHERE curso_id=%s LIMIT 1", (curso_id,))
+            if cursor.fetchone():
+                _promover(conn, cursor, curso_id, info)
+        if info[1] >= info[0]:
+            return {"ok": False, "cupo": info[0], "matriculados": info[1]}
+        info[1] += 1
+        _guardar_matriculados(cursor, curso_id, info[1])
+        return {"ok": True, "cupo": info[0], "matriculados": info[1]}
+    finally:
+        cursor.close()
+
+def liberar_cupo(conn, curso_id):
+    """Devuelve un cupo (retiro de una matrícula activa) y promueve a la lista en la misma transacción."""
+    ensure_schema("lista_espera", ESQUEMA_LISTA_ESPERA)
+    cursor = conn.cursor()
+    try:
+        info = _bloquear_cupo(cursor, curso_id)
+        if info is None:
+            return []
+        info[1] = max(info[1] - 1, 0)
+        return _promover(conn, cursor, curso_id, info)
+    finally:
+        cursor.close()
+
+def recalcular_cupo(conn, curso_id):
+    """Recuenta las matrículas activas del curso (tras borrados masivos) y promueve si quedó espacio."""
+    ensure_schema("lista_espera", ESQUEMA_LISTA_ESPERA)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE cursos_cupos SET matriculados=NULL WHERE curso_id=%s", (curso_id,))
+        info = _bloquear_cupo(cursor, curso_id)
+        return [] if info is None else _promover(conn, cursor, curso_id, info)
+    finally:
+        cursor.close()
+
+def fijar_cupo(conn, curso_id, cupo):
+    """Crea o cambia el cupo del curso; si crece, se promueve a la lista en la misma transacción."""
+    ensure_schema("lista_espera", ESQUEMA_LISTA_ESPERA)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO cursos_cupos (curso_id, cupo, matriculados) VALUES (%s, %s, NULL)
+            ON DUPLICATE KEY UPDATE cupo = VALUES(cupo)
+        """, (curso_id, cupo))
+        info = _bloquear_cupo(cursor, curso_id)
+        return info, _promover(conn, cursor, curso_id, info)
+    finally:
+        cursor.close()
+
+def encolar(conn, curso_id, estudiante_id, prioridad=0):
+    """Agrega al estudiante a la lista del curso; devuelve True si no estaba ya."""
+    ensure_schema("lista_espera", ESQUEMA_LISTA_ESPERA)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            INSERT IGNORE INTO lista_espera (curso_id, estudiante_id, prioridad, creado_en)
+            VALUES (%s, %s, %s, %s)
+        """, (curso_id, estudiante_id, prioridad, datetime.now()))
+        if cursor.rowcount == 0:
+            return False
+        registrar_evento(conn, "lista_espera.agregado", "lista_espera", cursor.lastrowid, {
+            "curso_id": curso_id, "estudiante_id": estudiante_id, "prioridad": prioridad
+        })
+        return True
+    finally:
+        cursor.close()
+
+def posicion(conn, curso_id, estudiante_id):
+    """
+    Posición (1 = siguiente) del estudiante en la lista del curso, o None.
+    Cuenta solo las entradas que van delante, con dos rangos sobre idx_turno
+    (solo índice, sin leer filas ni recorrer la lista completa).
+    """
+    ensure_schema("lista_espera", ESQUEMA_LISTA_ESPERA)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT id, prioridad FROM lista_espera WHERE curso_id=%s AND estudiante_id=%s",
+                       (curso_id, estudiante_id))
+        fila = cursor.fetchone()
+        if not fila:
+            return None
+        espera_id, prioridad = fila
+        cursor.execute("SELECT COUNT(*) FROM lista_espera WHERE curso_id=%s AND prioridad > %s",
+                       (curso_id, prioridad))
+        delante = cursor.fetchone()[0]
+        cursor.execute("SELECT COUNT(*) FROM lista_espera WHERE curso_id=%s AND prioridad = %s AND id < %s",
+                       (curso_id, prioridad, espera_id))
+        return delante + cursor.fetchone()[0] + 1
+    finally:
+        cursor.close()
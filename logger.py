@@ -1,12 +1,48 @@
 # logger.py
-from db import get_connection
-from datetime import datetime
+from db import get_connection, ensure_schema
+from datetime import datetime, timedelta
 from flask import request, g
-import socket, time, logging, os, uuid
+from mysql.connector import errors
+import socket, time, logging, os, uuid, json, glob, threading
 
 DOMAIN = "continental.edu.pe/soa"
 LOG_FILE = os.path.join(os.path.dirname(__file__), "soa_matricula.log")
 
+# Spool en disco para los registros de la tabla logs cuando la BD no responde
+SPOOL_DIR = os.environ.get("LOGS_SPOOL_DIR", os.path.join(os.path.dirname(__file__), "logs_spool"))
+SPOOL_INTERVALO = float(os.environ.get("LOGS_SPOOL_INTERVALO", "2"))        # segundos entre intentos
+SPOOL_ESPERA_MAXIMA = float(os.environ.get("LOGS_SPOOL_ESPERA_MAXIMA", "30"))
+SPOOL_LOTE = 500
+SPOOL_GRACIA = 5    # segundos tras cerrar el minuto de un segmento antes de borrarlo
+SPOOL_RETENCION_ESTADO = 24  # horas que se conserva el avance de un segmento ya borrado
+
+ESQUEMA_SPOOL = [
+    """
+    CREATE TABLE IF NOT EXISTS logs_spool_estado (
+        segmento VARCHAR(100) PRIMARY KEY,
+        linea INT NOT NULL DEFAULT 0,
+        actualizado_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+INSERT_LOG = """
+    INSERT INTO logs (servicio, categoria, operacion, mensaje, fecha_hora, ip, usuario, duracion, request_id)
+    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+"""
+# Errores que indican BD caída o inalcanzable (los de datos no van al spool).
+# La extensión en C puede reportarlos como DatabaseError genérico: se decide por errno.
+ERRORES_CONEXION = (errors.InterfaceError, errors.OperationalError, errors.PoolError)
+ERRNOS_CONEXION = {2002, 2003, 2006, 2013}   # socket, host, server gone away, conexión perdida
+
+def _es_error_conexion(e, al_conectar):
+    """Cualquier error de mysql al pedir la conexión, o uno de conexión después."""
+    if not isinstance(e, errors.Error):
+        return False
+    return al_conectar or isinstance(e, ERRORES_CONEXION) or getattr(e, "errno", None) in ERRNOS_CONEXION
+
+CAMPOS_LOG = ("servicio", "categoria", "operacion", "mensaje", "fecha_hora", "ip", "usuario", "duracion", "request_id")
+
 # ==========================================================
 # FORMATEADOR SEGURO
 # ==========================================================
@@ -55,11 +91,157 @@ def _get_user():
         return "anon"
 
 def _get_request_id():
-    rid = getattr(g, "request_id", None)
-    if not rid:
-        rid = str(uuid.uuid4())[:8]
-        g.request_id = rid
-    return rid
+    try:
+        rid = getattr(g, "request_id", None)
+        if not rid:
+            rid = str(uuid.uuid4())[:8]
+            g.request_id = rid
+        return rid
+    except RuntimeError:
+        # Fuera de un request (hilos de trabajo, línea de comandos)
+        return "-"
+
+# ==========================================================
+# SPOOL EN DISCO (BD caída o lenta)
+# Mientras hay spool pendiente los registros se anexan a segmentos JSON por
+# minuto y proceso, y ningún request intenta conectarse: solo el hilo
+# reproductor prueba la BD (con espera creciente) y vuelca los segmentos en orden.
+# ==========================================================
+_spool = {"activo": None, "espera": SPOOL_INTERVALO}
+_spool_lock = threading.Lock()
+_reproductor = None
+
+def _segmentos():
+    return sorted(glob.glob(os.path.join(SPOOL_DIR, "spool-*.jsonl")))
+
+def _usar_spool():
+    if _spool["activo"] is None:
+        # Primer log del proceso: segmentos que quedaron de una ejecución anterior
+        _spool["activo"] = bool(_segmentos())
+        if _spool["activo"]:
+            _iniciar_reproductor()
+    return _spool["activo"]
+
+def _escribir_en_spool(registro):
+    with _spool_lock:
+        _spool["activo"] = True
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        nombre = f"spool-{datetime.now().strftime('%Y%m%d%H%M')}-{os.getpid()}.jsonl"
+        with open(os.path.join(SPOOL_DIR, nombre), "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+    _iniciar_reproductor()
+
+def _segmento_cerrado(nombre):
+    """Un segmento ya no recibe registros cuando pasó su minuto (más un margen)."""
+    minuto = datetime.strptime(nombre.split("-")[1], "%Y%m%d%H%M")
+    return datetime.now() >= minuto + timedelta(minutes=1, seconds=SPOOL_GRACIA)
+
+def _purgar_estado(cur):
+    """Borra el avance de segmentos antiguos que ya no están en disco."""
+    limite = datetime.now() - timedelta(hours=SPOOL_RETENCION_ESTADO)
+    cur.execute("SELECT segmento FROM logs_spool_estado WHERE actualizado_en < %s", (limite,))
+    vencidos = [fila[0] for fila in cur.fetchall()
+                if not os.path.exists(os.path.join(SPOOL_DIR, fila[0]))]
+    if vencidos:
+        cur.execute(f"DELETE FROM logs_spool_estado WHERE segmento IN ({', '.join(['%s'] * len(vencidos))})",
+                    vencidos)
+
+def drenar_spool():
+    """
+    Inserta en logs las líneas pendientes de cada segmento, en orden. El avance
+    de cada segmento se guarda en logs_spool_estado en la misma transacción que
+    el lote insertado, así que reintentar (o dos procesos a la vez) no duplica.
+    La fila de avance queda tras borrar el segmento: otro proceso que ya lo había
+    leído la encuentra completa y no lo vuelve a insertar.
+    Devuelve cuántos segmentos quedan en disco.
+    """
+    ensure_schema("logs_spool", ESQUEMA_SPOOL)
+    for ruta in _segmentos():
+        nombre = os.path.basename(ruta)
+        cerrado = _segmento_cerrado(nombre)
+        try:
+            with open(ruta, encoding="utf-8") as f:
+                lineas = f.readlines()
+        except FileNotFoundError:
+            continue    # otro proceso lo terminó y lo borró
+        if not cerrado and lineas and not lineas[-1].endswith("\n"):
+            lineas.pop()    # línea a medio escribir por otro proceso
+
+        conn = get_connection(deadline=False)
+        cur = conn.cursor()
+        try:
+            cur.execute("INSERT IGNORE INTO logs_spool_estado (segmento, linea) VALUES (%s, 0)", (nombre,))
+            while True:
+                cur.execute("SELECT linea FROM logs_spool_estado WHERE segmento=%s FOR UPDATE", (nombre,))
+                hecho = cur.fetchone()[0]
+                lote = lineas[hecho:hecho + SPOOL_LOTE]
+                if not lote:
+                    conn.commit()
+                    break
+                filas = []
+                for linea in lote:
+                    try:
+                        registro = json.loads(linea)
+                    except ValueError:
+                        continue    # línea truncada por una caída del proceso
+                    filas.append(tuple(registro.get(c) for c in CAMPOS_LOG))
+                try:
+                    if filas:
+                        cur.executemany(INSERT_LOG, filas)
+                except errors.DataError:
+                    # Un registro inválido no debe bloquear el resto del segmento
+                    for fila in filas:
+                        try:
+                            cur.execute(INSERT_LOG, fila)
+                        except errors.DataError as e:
+                            print(f"⚠️ LOGGER: registro del spool descartado ({nombre}): {e}")
+                cur.execute("UPDATE logs_spool_estado SET linea=%s WHERE segmento=%s",
+                            (hecho + len(lote), nombre))
+                conn.commit()
+
+            if cerrado:
+                try:
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass    # otro proceso ya lo terminó
+                _purgar_estado(cur)
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            conn.close()
+    return len(_segmentos())
+
+def _reproducir():
+    global _reproductor
+    while True:
+        time.sleep(_spool["espera"])
+        try:
+            drenar_spool()
+            if _spool["activo"]:
+                # Todo lo pendiente ya está en la BD: los requests vuelven a escribir
+                # directo y una última pasada recoge lo anexado mientras tanto.
+                with _spool_lock:
+                    _spool["activo"] = False
+                drenar_spool()
+            _spool["espera"] = SPOOL_INTERVALO
+        except Exception as e:
+            _spool["espera"] = min(_spool["espera"] * 2, SPOOL_ESPERA_MAXIMA)
+            print(f"⚠️ LOGGER: BD no disponible para el spool, reintento en {_spool['espera']}s: {e}")
+            continue
+        with _spool_lock:
+            if not _spool["activo"] and not _segmentos():
+                _reproductor = None
+                return
+
+def _iniciar_reproductor():
+    global _reproductor
+    with _spool_lock:
+        if _reproductor is None:
+            _reproductor = threading.Thread(target=_reproducir, name="logs-spool", daemon=True)
+            _reproductor.start()
 
 # ==========================================================
 # REGISTRO DE EVENTOS
@@ -72,6 +254,8 @@ def log_event(servicio, categoria, operacion, mensaje, inicio=None, usuario=None
     """
     conn = None
     cur = None
+    registro = None
+    al_conectar = False
     try:
         ip = _get_client_ip()
         usuario = usuario or _get_user()
@@ -91,18 +275,27 @@ def log_event(servicio, categoria, operacion, mensaje, inicio=None, usuario=None
         elif categoria == "ERROR":
             logger.error(mensaje_fmt, extra=extra)
 
-        # Guarda también en la BD
-        conn = get_connection()
+        # Guarda también en la BD (o en el spool mientras la BD no está sana)
+        registro = dict(zip(CAMPOS_LOG, (f"{DOMAIN}/{servicio}", categoria, operacion, mensaje,
+                                         fecha_hora, ip, usuario, duracion, request_id)))
+        if _usar_spool():
+            _escribir_en_spool(registro)
+            return
+        al_conectar = True
+        conn = get_connection(deadline=False)
+        al_conectar = False
         cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO logs (servicio, categoria, operacion, mensaje, fecha_hora, ip, usuario, duracion, request_id)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        """, (f"{DOMAIN}/{servicio}", categoria, operacion, mensaje, fecha_hora, ip, usuario, duracion, request_id))
+        cur.execute(INSERT_LOG, tuple(registro[c] for c in CAMPOS_LOG))
         conn.commit()
 
     except Exception as e:
             print(f"⚠️ ERROR LOGGER: {e}")
             logging.getLogger("logger").error(f"[{DOMAIN}/logger][ERROR] Fallo al registrar log: {e}")
+            if registro is not None and _es_error_conexion(e, al_conectar):
+                try:
+                    _escribir_en_spool(registro)
+                except OSError as err:
+                    print(f"⚠️ ERROR LOGGER: no se pudo escribir en el spool: {err}")
     finally:
         if cur: cur.close()
         if conn: conn.close()
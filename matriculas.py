@@ -1,7 +1,12 @@
 from flask import Blueprint, render_template, request, jsonify
-from db import get_connection
+from db import get_connection, ensure_schema
+from consultas import ejecutar
+from coalescer import coalescer
 from datetime import datetime
 from logger import log_event   # ✅ Importar el logger
+from academico import reservar_creditos, liberar_creditos, MAX_CREDITOS_CICLO
+from lista_espera import ocupar_cupo, liberar_cupo, fijar_cupo, encolar, posicion
+from eventos import registrar_evento
 import time                   # ✅ Para medir duración de ejecución
 
 matriculas_bp = Blueprint('matriculas', __name__)
@@ -10,25 +15,17 @@ matriculas_bp = Blueprint('matriculas', __name__)
 # LISTAR MATRÍCULAS EN TABLA (para mostrar en la interfaz)
 # ======================================================
 @matriculas_bp.route("/listar", methods=["GET"])
+@coalescer
 def listar_matriculas():
     inicio = time.time()  # ⏱ Inicio para calcular duración
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT 
-                m.id, 
-                e.nombre AS estudiante, 
-                e.ciclo AS ciclo_estudiante,
-                c.nombre AS curso, 
-                m.fecha, 
-                m.estado
-            FROM matriculas m
-            JOIN estudiantes e ON m.estudiante_id = e.id
-            JOIN cursos c ON m.curso_id = c.id
-            ORDER BY m.id DESC
-        """)
-        data = cursor.fetchall()
+        conn = get_connection(lectura=True)
+        # Por defecto solo matrículas vivas; ?incluir_archivo=1 suma los periodos archivados
+        consulta = "matriculas.listar"
+        if request.args.get("incluir_archivo") == "1":
+            ensure_schema("matriculas_archivo", ["CREATE TABLE IF NOT EXISTS matriculas_archivo LIKE matriculas"])
+            consulta = "matriculas.listar_con_archivo"
+        data = ejecutar(conn, consulta)
 
         # ✅ Registrar acción en el log
         log_event(
@@ -53,7 +50,6 @@ def listar_matriculas():
         return jsonify({"status": "error", "message": str(e)}), 500
     finally:
         try:
-            cursor.close()
             conn.close()
         except:
             pass
@@ -66,7 +62,7 @@ def listar_matriculas():
 def matriculas_html():
     inicio = time.time()
     try:
-        conn = get_connection()
+        conn = get_connection(lectura=True)
         cursor = conn.cursor(dictionary=True)
 
         # Traer todos los estudiantes
@@ -131,11 +127,69 @@ def registrar_matricula():
         cursor = conn.cursor(dictionary=True)
 
         # Validar duplicado
-        cursor.execute(
-            "SELECT COUNT(*) AS existe FROM matriculas WHERE estudiante_id=%s AND curso_id=%s",
-            (estudiante_id, curso_id)
-        )
-        if cursor.fetchone()["existe"] > 0:
+        if ejecutar(conn, "matriculas.existe", (estudiante_id, curso_id), uno=True)["existe"] > 0:
+            log_event(
+                servicio="matriculas-service",
+                categoria="WARNING",
+                operacion="POST",
+                mensaje=f"Matrícula duplicada detectada para estudiante {estudiante_id} y curso {curso_id}",
+                inicio=inicio
+            )
+            return jsonify({"status": "error", "message": "Ya existe una matrícula con esos datos"}), 400
+
+        # El estudiante debe existir antes de ocupar cupo o entrar a la lista de espera
+        if ejecutar(conn, "estudiantes.existe", (estudiante_id,), uno=True)["existe"] == 0:
+            log_event(
+                servicio="matriculas-service",
+                categoria="WARNING",
+                operacion="POST",
+                mensaje=f"Intento de matrícula de estudiante inexistente {estudiante_id}",
+                inicio=inicio
+            )
+            return jsonify({"status": "error", "message": "Estudiante no encontrado"}), 404
+
+        # Ya en lista de espera: se responde su posición sin bloquear nada
+        turno = posicion(conn, curso_id, estudiante_id)
+        if turno is not None:
+            return jsonify({"status": "success", "message": "El estudiante ya está en la lista de espera",
+                            "posicion": turno}), 202
+
+        # Cupo del curso (bloquea la fila de cupos antes que la de créditos)
+        cupo = ocupar_cupo(conn, curso_id)
+        if cupo is not None and not cupo["ok"]:
+            encolar(conn, curso_id, estudiante_id)
+            turno = posicion(conn, curso_id, estudiante_id)
+            conn.commit()
+            log_event(
+                servicio="matriculas-service",
+                categoria="INFO",
+                operacion="POST",
+                mensaje=f"Curso {curso_id} sin cupo: estudiante {estudiante_id} en lista de espera (posición {turno})",
+                inicio=inicio
+            )
+            return jsonify({"status": "success", "message": "Curso sin cupo: estudiante agregado a la lista de espera",
+                            "posicion": turno}), 202
+
+        # Validar tope de créditos del ciclo (bloquea el acumulado del estudiante)
+        reserva = reservar_creditos(conn, estudiante_id, curso_id)
+        if reserva is None:
+            conn.rollback()
+            log_event(
+                servicio="matriculas-service",
+                categoria="WARNING",
+                operacion="POST",
+                mensaje=f"Intento de matrícula en curso inexistente {curso_id}",
+                inicio=inicio
+            )
+            return jsonify({"status": "error", "message": "Curso no encontrado"}), 404
+
+        # Revalidar duplicado con lectura bloqueante: con el acumulado del estudiante
+        # ya bloqueado, un request idéntico que se adelantó ya hizo commit y se ve aquí
+        cursor.execute("""
+            SELECT id FROM matriculas WHERE estudiante_id=%s AND curso_id=%s LIMIT 1 FOR UPDATE
+        """, (estudiante_id, curso_id))
+        if cursor.fetchone():
+            conn.rollback()
             log_event(
                 servicio="matriculas-service",
                 categoria="WARNING",
@@ -144,12 +198,32 @@ def registrar_matricula():
                 inicio=inicio
             )
             return jsonify({"status": "error", "message": "Ya existe una matrícula con esos datos"}), 400
+        if not reserva["ok"]:
+            conn.rollback()
+            log_event(
+                servicio="matriculas-service",
+                categoria="WARNING",
+                operacion="POST",
+                mensaje=(f"Tope de créditos excedido para estudiante {estudiante_id} en ciclo {reserva['ciclo']}: "
+                         f"{reserva['total']} + {reserva['creditos']} > {MAX_CREDITOS_CICLO}"),
+                inicio=inicio
+            )
+            return jsonify({
+                "status": "error",
+                "message": f"Se excede el máximo de {MAX_CREDITOS_CICLO} créditos en el ciclo {reserva['ciclo']}",
+                "creditos_actuales": reserva["total"],
+                "creditos_curso": reserva["creditos"]
+            }), 400
 
         # Insertar matrícula
         cursor.execute("""
             INSERT INTO matriculas (estudiante_id, curso_id, fecha, estado)
             VALUES (%s, %s, %s, %s)
         """, (estudiante_id, curso_id, datetime.now(), "activo"))
+        registrar_evento(conn, "matricula.creada", "matricula", cursor.lastrowid, {
+            "estudiante_id": estudiante_id, "curso_id": curso_id,
+            "ciclo": reserva["ciclo"], "creditos": reserva["creditos"], "estado": "activo"
+        })
         conn.commit()
 
         # ✅ Registrar en el log el éxito
@@ -164,6 +238,10 @@ def registrar_matricula():
         return jsonify({"status": "success", "message": "Matrícula registrada correctamente"}), 201
     except Exception as e:
         print("❌ Error al registrar matrícula:", e)
+        try:
+            conn.rollback()
+        except:
+            pass
         # ✅ Registrar error en el log
         log_event(
             servicio="matriculas-service",
@@ -179,3 +257,144 @@ def registrar_matricula():
             conn.close()
         except:
             pass
+
+
+# ======================================================
+# RETIRAR MATRÍCULA (libera créditos y cupo, promueve la lista de espera)
+# ======================================================
+@matriculas_bp.route("/<int:id>", methods=["DELETE"])
+def retirar_matricula(id):
+    inicio = time.time()
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT estudiante_id, curso_id, estado FROM matriculas WHERE id=%s FOR UPDATE", (id,))
+        matricula = cursor.fetchone()
+        if not matricula:
+            log_event(
+                servicio="matriculas-service",
+                categoria="WARNING",
+                operacion="DELETE",
+                mensaje=f"Intento de retiro de matrícula inexistente {id}",
+                inicio=inicio
+            )
+            return jsonify({"status": "error", "message": "Matrícula no encontrada"}), 404
+
+        estudiante_id, curso_id = matricula["estudiante_id"], matricula["curso_id"]
+        cursor.execute("SELECT COUNT(*) AS notas FROM evaluaciones WHERE id_estudiante=%s AND id_curso=%s",
+                       (estudiante_id, curso_id))
+        if cursor.fetchone()["notas"] > 0:
+            conn.rollback()
+            return jsonify({"status": "error", "message": "La matrícula ya tiene notas registradas"}), 400
+
+        # Mismo orden de bloqueo que al matricular: cupo del curso y luego créditos
+        promovidos = liberar_cupo(conn, curso_id) if matricula["estado"] == "activo" else []
+        cursor.execute("DELETE FROM matriculas WHERE id=%s", (id,))
+        liberar_creditos(conn, estudiante_id, curso_id)
+        registrar_evento(conn, "matricula.eliminada", "matricula", id, {
+            "estudiante_id": estudiante_id, "curso_id": curso_id, "promovidos": promovidos
+        })
+        conn.commit()
+
+        log_event(
+            servicio="matriculas-service",
+            categoria="INFO",
+            operacion="DELETE",
+            mensaje=(f"Matrícula {id} retirada (estudiante {estudiante_id}, curso {curso_id}); "
+                     f"promovidos desde la lista de espera: {promovidos or 'ninguno'}"),
+            inicio=inicio
+        )
+        return jsonify({"status": "success", "message": "Matrícula retirada correctamente",
+                        "promovidos": promovidos}), 200
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        log_event(
+            servicio="matriculas-service",
+            categoria="ERROR",
+            operacion="DELETE",
+            mensaje=f"Error al retirar matrícula {id}: {str(e)}",
+            inicio=inicio
+        )
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        if conn:
+            cursor.close()
+            conn.close()
+
+
+# ======================================================
+# POSICIÓN EN LA LISTA DE ESPERA (GET)
+# ======================================================
+@matriculas_bp.route("/espera/<int:curso_id>/<int:estudiante_id>", methods=["GET"])
+def posicion_lista_espera(curso_id, estudiante_id):
+    inicio = time.time()
+    conn = None
+    try:
+        conn = get_connection(lectura=True)
+        turno = posicion(conn, curso_id, estudiante_id)
+        if turno is None:
+            return jsonify({"status": "error", "message": "El estudiante no está en la lista de espera"}), 404
+        return jsonify({"status": "success", "curso_id": curso_id, "estudiante_id": estudiante_id,
+                        "posicion": turno}), 200
+    except Exception as e:
+        log_event(
+            servicio="matriculas-service",
+            categoria="ERROR",
+            operacion="GET",
+            mensaje=f"Error al consultar la lista de espera del curso {curso_id}: {str(e)}",
+            inicio=inicio
+        )
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
+
+
+# ======================================================
+# CUPO DE UN CURSO (PUT) {"cupo": 30}
+# ======================================================
+@matriculas_bp.route("/cupos/<int:curso_id>", methods=["PUT"])
+def actualizar_cupo(curso_id):
+    inicio = time.time()
+    data = request.get_json() or {}
+    cupo = data.get("cupo")
+    if not isinstance(cupo, int) or cupo < 0:
+        return jsonify({"status": "error", "message": "'cupo' debe ser un entero no negativo"}), 400
+
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM cursos WHERE id=%s", (curso_id,))
+        if not cursor.fetchone():
+            return jsonify({"status": "error", "message": "Curso no encontrado"}), 404
+
+        (cupo, matriculados), promovidos = fijar_cupo(conn, curso_id, cupo)
+        conn.commit()
+
+        log_event(
+            servicio="matriculas-service",
+            categoria="INFO",
+            operacion="PUT",
+            mensaje=f"Cupo del curso {curso_id} fijado en {cupo}; promovidos: {promovidos or 'ninguno'}",
+            inicio=inicio
+        )
+        return jsonify({"status": "success", "cupo": cupo, "matriculados": matriculados,
+                        "promovidos": promovidos}), 200
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        log_event(
+            servicio="matriculas-service",
+            categoria="ERROR",
+            operacion="PUT",
+            mensaje=f"Error al fijar el cupo del curso {curso_id}: {str(e)}",
+            inicio=inicio
+        )
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        if conn:
+            cursor.close()
+            conn.close()
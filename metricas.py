@@ -0,0 +1,39 @@
+# metricas.py
+from flask import Blueprint, jsonify
+from collections import defaultdict
+import threading
+
+metricas_bp = Blueprint("metricas", __name__)
+
+# ======================================================
+# CONTADORES EN MEMORIA (por proceso)
+# ======================================================
+_contadores = defaultdict(int)
+_contadores_lock = threading.Lock()
+
+# Otras secciones del reporte: nombre -> función sin argumentos que devuelve un dict
+_proveedores = {}
+
+def incrementar(nombre, valor=1):
+    with _contadores_lock:
+        _contadores[nombre] += valor
+
+def contadores():
+    with _contadores_lock:
+        return dict(_contadores)
+
+def registrar_proveedor(nombre, funcion):
+    _proveedores[nombre] = funcion
+
+# ======================================================
+# EXPORTAR MÉTRICAS (GET)
+# ======================================================
+@metricas_bp.route("/", methods=["GET"])
+def exportar_metricas():
+    data = {"contadores": contadores()}
+    for nombre, funcion in _proveedores.items():
+        try:
+            data[nombre] = funcion()
+        except Exception as e:
+            data[nombre] = {"error": str(e)}
+    return jsonify({"status": "success", "data": data}), 200
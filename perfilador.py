@@ -0,0 +1,151 @@
+# perfilador.py
+from flask import Blueprint, g, request, jsonify, send_file
+from datetime import datetime
+import cProfile, pstats, hmac, itertools, json, os, re, threading, time
+
+perfiles_bp = Blueprint("perfiles", __name__)
+
+# ======================================================
+# CONFIGURACIÓN
+# Sin PERFIL_TOKEN ni PERFIL_MUESTREO no se instala ningún hook (costo cero).
+# ======================================================
+PERFIL_TOKEN = os.environ.get("PERFIL_TOKEN", "")
+PERFIL_MUESTREO = int(os.environ.get("PERFIL_MUESTREO", "0"))     # 1 de cada N requests (0 = nunca)
+PERFIL_DIR = os.environ.get("PERFIL_DIR", os.path.join(os.path.dirname(__file__), "perfiles"))
+PERFIL_MAXIMOS = int(os.environ.get("PERFIL_MAXIMOS", "200"))     # perfiles que se conservan en disco
+HEADER_PERFIL = "X-Perfil"
+
+_contador = itertools.count(1)
+# cProfile no admite dos perfiles activos a la vez en el proceso: uno por vez
+_en_curso = threading.Lock()
+_ID_VALIDO = re.compile(r"^[A-Za-z0-9_-]+$")
+
+# ======================================================
+# HOOKS DEL REQUEST
+# ======================================================
+def _motivo():
+    if PERFIL_TOKEN and hmac.compare_digest(request.headers.get(HEADER_PERFIL, ""), PERFIL_TOKEN):
+        return "header"
+    if PERFIL_MUESTREO and next(_contador) % PERFIL_MUESTREO == 0:
+        return "muestreo"
+    return None
+
+def _antes_de_request():
+    motivo = _motivo()
+    if motivo is None or not _en_curso.acquire(blocking=False):
+        return
+    g.perfil = cProfile.Profile()
+    g.perfil_motivo = motivo
+    g.perfil_inicio = time.time()
+    g.perfil.enable()
+
+def _despues_de_request(response):
+    if g.get("perfil") is not None:
+        response.headers["X-Perfil-Id"] = g.get("request_id", "-")
+        g.perfil_estado = response.status_code
+    return response
+
+def _al_terminar(exc):
+    perfil = g.pop("perfil", None)
+    if perfil is None:
+        return
+    try:
+        perfil.disable()
+        _guardar(perfil)
+    except Exception as e:
+        print("⚠️ PERFILADOR: no se pudo guardar el perfil:", e)
+    finally:
+        _en_curso.release()
+
+def _guardar(perfil):
+    os.makedirs(PERFIL_DIR, exist_ok=True)
+    request_id = g.get("request_id") or datetime.now().strftime("%H%M%S%f")
+    perfil.dump_stats(os.path.join(PERFIL_DIR, f"{request_id}.prof"))
+    with open(os.path.join(PERFIL_DIR, f"{request_id}.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "request_id": request_id,
+            "metodo": request.method,
+            "ruta": request.full_path.rstrip("?"),
+            "endpoint": request.endpoint,
+            "estado": g.get("perfil_estado"),
+            "motivo": g.get("perfil_motivo"),
+            "duracion_ms": round((time.time() - g.perfil_inicio) * 1000, 2),
+            "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }, f, ensure_ascii=False)
+    _purgar()
+
+def _purgar():
+    metadatos = sorted(_metadatos(), key=os.path.getmtime)
+    for ruta in metadatos[:max(len(metadatos) - PERFIL_MAXIMOS, 0)]:
+        for extension in (".json", ".prof"):
+            try:
+                os.remove(ruta[:-len(".json")] + extension)
+            except FileNotFoundError:
+                pass
+
+def _metadatos():
+    if not os.path.isdir(PERFIL_DIR):
+        return []
+    return [os.path.join(PERFIL_DIR, n) for n in os.listdir(PERFIL_DIR) if n.endswith(".json")]
+
+def instalar_perfilador(app):
+    """Registra los hooks solo si el perfilado está configurado."""
+    if not PERFIL_TOKEN and PERFIL_MUESTREO <= 0:
+        return
+    app.before_request(_antes_de_request)
+    app.after_request(_despues_de_request)
+    app.teardown_request(_al_terminar)
+
+# ======================================================
+# CONSULTA DE PERFILES (GET)
+# Con PERFIL_TOKEN exigen el mismo header; sin él, solo desde la máquina local.
+# ======================================================
+def _autorizado():
+    if PERFIL_TOKEN:
+        return hmac.compare_digest(request.headers.get(HEADER_PERFIL, ""), PERFIL_TOKEN)
+    return request.remote_addr in ("127.0.0.1", "::1")
+
+@perfiles_bp.before_request
+def _verificar_acceso():
+    if not _autorizado():
+        return jsonify({"status": "error", "message": "No autorizado"}), 403
+
+@perfiles_bp.route("/", methods=["GET"])
+def listar_perfiles():
+    limite = request.args.get("limite", 50, type=int)
+    perfiles = []
+    for ruta in sorted(_metadatos(), key=os.path.getmtime, reverse=True)[:limite]:
+        try:
+            with open(ruta, encoding="utf-8") as f:
+                perfiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue    # borrado por la purga mientras se listaba
+    return jsonify({"status": "success", "data": perfiles}), 200
+
+@perfiles_bp.route("/<string:request_id>", methods=["GET"])
+def ver_perfil(request_id):
+    """Funciones con mayor tiempo acumulado del perfil (?top=N)."""
+    ruta = os.path.join(PERFIL_DIR, f"{request_id}.prof")
+    if not _ID_VALIDO.match(request_id) or not os.path.exists(ruta):
+        return jsonify({"status": "error", "message": "Perfil no encontrado"}), 404
+    top = min(request.args.get("top", 30, type=int), 500)
+
+    stats = pstats.Stats(ruta)
+    funciones = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+    data = [{
+        "funcion": f"{archivo}:{linea}({nombre})",
+        "llamadas": llamadas,
+        "tiempo_propio_ms": round(propio * 1000, 3),
+        "tiempo_acumulado_ms": round(acumulado * 1000, 3),
+    } for (archivo, linea, nombre), (_, llamadas, propio, acumulado, _) in funciones]
+    return jsonify({"status": "success", "request_id": request_id,
+                    "tiempo_total_ms": round(stats.total_tt * 1000, 3), "data": data}), 200
+
+@perfiles_bp.route("/<string:request_id>/descargar", methods=["GET"])
+def descargar_perfil(request_id):
+    """Archivo pstats para snakeviz, flameprof, tuna o gprof2dot."""
+    ruta = os.path.join(PERFIL_DIR, f"{request_id}.prof")
+    if not _ID_VALIDO.match(request_id) or not os.path.exists(ruta):
+        return jsonify({"status": "error", "message": "Perfil no encontrado"}), 404
+    return send_file(ruta, mimetype="application/octet-stream", as_attachment=True,
+                     download_name=f"{request_id}.prof")
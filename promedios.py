@@ -0,0 +1,393 @@
+# promedios.py
+from flask import Blueprint, request, jsonify
+from db import get_connection, ensure_schema
+from logger import log_event
+import argparse, time
+
+promedios_bp = Blueprint("promedios", __name__)
+SERVICE = "continental.edu.pe/soa/promedios-service"
+
+MAX_LIMITE_RANKING = 200
+
+ESQUEMA_PROMEDIOS = [
+    """
+    CREATE TABLE IF NOT EXISTS promedio_ciclo (
+        estudiante_id INT NOT NULL,
+        ciclo VARCHAR(20) NOT NULL,
+        suma_ponderada DECIMAL(14,3) NOT NULL DEFAULT 0,
+        creditos INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (estudiante_id, ciclo)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS promedio_estudiante (
+        estudiante_id INT NOT NULL PRIMARY KEY,
+        carrera VARCHAR(100) NOT NULL,
+        ciclo VARCHAR(20) NOT NULL,
+        suma_ponderada DECIMAL(14,3) NOT NULL DEFAULT 0,
+        creditos INT NOT NULL DEFAULT 0,
+        promedio DECIMAL(6,3) NOT NULL DEFAULT 0,
+        INDEX idx_ranking (carrera, ciclo, promedio DESC, estudiante_id)
+    )
+    """
+]
+
+# ======================================================
+# ACTUALIZACIÓN INCREMENTAL (usada al registrar notas)
+# ======================================================
+def registrar_nota(conn, estudiante_id, curso_id, nota):
+    """
+    Suma una nota al promedio ponderado del estudiante, del ciclo del curso y
+    general, dentro de la transacción de quien registra la evaluación.
+    Solo toca dos filas por nota; no recalcula desde evaluaciones.
+    """
+    ensure_schema("promedios", ESQUEMA_PROMEDIOS)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT creditos, ciclo FROM cursos WHERE id=%s", (curso_id,))
+        creditos, ciclo_curso = cursor.fetchone()
+        cursor.execute("SELECT carrera, ciclo FROM estudiantes WHERE id=%s", (estudiante_id,))
+        carrera, ciclo_estudiante = cursor.fetchone()
+
+        creditos = int(creditos)
+        ponderado = float(nota) * creditos
+
+        cursor.execute("""
+            INSERT INTO promedio_ciclo (estudiante_id, ciclo, suma_ponderada, creditos)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                suma_ponderada = suma_ponderada + VALUES(suma_ponderada),
+                creditos = creditos + VALUES(creditos)
+        """, (estudiante_id, str(ciclo_curso), ponderado, creditos))
+
+        cursor.execute("""
+            INSERT INTO promedio_estudiante
+                (estudiante_id, carrera, ciclo, suma_ponderada, creditos, promedio)
+            VALUES (%s, %s, %s, %s, %s, IF(%s > 0, %s / %s, 0))
+            ON DUPLICATE KEY UPDATE
+                carrera = VALUES(carrera),
+                ciclo = VALUES(ciclo),
+                suma_ponderada = suma_ponderada + VALUES(suma_ponderada),
+                creditos = creditos + VALUES(creditos),
+                promedio = IF(creditos > 0, suma_ponderada / creditos, 0)
+        """, (estudiante_id, carrera, str(ciclo_estudiante), ponderado, creditos,
+              creditos, ponderado, creditos))
+    finally:
+        cursor.close()
+
+def descontar_notas(conn, evaluacion_ids, tabla="evaluaciones"):
+    """
+    Resta del promedio un lote de evaluaciones que se van a borrar (inverso de
+    registrar_nota, en bloque). Llamar antes del DELETE y en la misma transacción.
+    tabla = "evaluaciones_archivo" para notas archivadas (también cuentan en el promedio).
+    """
+    if not evaluacion_ids:
+        return
+    ensure_schema("promedios", ESQUEMA_PROMEDIOS)
+    marcadores = ", ".join(["%s"] * len(evaluacion_ids))
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            UPDATE promedio_ciclo p
+            JOIN (
+                SELECT ev.id_estudiante, c.ciclo,
+                       SUM(ev.nota * c.creditos) AS suma, SUM(c.creditos) AS creditos
+                FROM {tabla} ev JOIN cursos c ON ev.id_curso = c.id
+                WHERE ev.id IN ({marcadores})
+                GROUP BY ev.id_estudiante, c.ciclo
+            ) x ON p.estudiante_id = x.id_estudiante AND p.ciclo = x.ciclo
+            SET p.suma_ponderada = p.suma_ponderada - x.suma,
+                p.creditos = p.creditos - x.creditos
+        """, evaluacion_ids)
+        cursor.execute(f"""
+            UPDATE promedio_estudiante p
+            JOIN (
+                SELECT ev.id_estudiante,
+                       SUM(ev.nota * c.creditos) AS suma, SUM(c.creditos) AS creditos
+                FROM {tabla} ev JOIN cursos c ON ev.id_curso = c.id
+                WHERE ev.id IN ({marcadores})
+                GROUP BY ev.id_estudiante
+            ) x ON p.estudiante_id = x.id_estudiante
+            SET p.suma_ponderada = p.suma_ponderada - x.suma,
+                p.creditos = p.creditos - x.creditos
+        """, evaluacion_ids)
+        # MySQL no garantiza el orden de asignación en un UPDATE multi-tabla:
+        # el promedio se recalcula aparte, con las sumas ya descontadas
+        cursor.execute(f"""
+            UPDATE promedio_estudiante
+            SET promedio = IF(creditos > 0, suma_ponderada / creditos, 0)
+            WHERE estudiante_id IN (SELECT id_estudiante FROM {tabla} WHERE id IN ({marcadores}))
+        """, evaluacion_ids)
+    finally:
+        cursor.close()
+
+def actualizar_grupo(conn, estudiante_id, carrera, ciclo):
+    """Mantiene la carrera/ciclo del ranking cuando cambian los datos del estudiante."""
+    ensure_schema("promedios", ESQUEMA_PROMEDIOS)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE promedio_estudiante SET carrera=%s, ciclo=%s WHERE estudiante_id=%s
+        """, (carrera, str(ciclo), estudiante_id))
+    finally:
+        cursor.close()
+
+def borrar_promedios(conn, estudiante_id):
+    ensure_schema("promedios", ESQUEMA_PROMEDIOS)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM promedio_ciclo WHERE estudiante_id=%s", (estudiante_id,))
+        cursor.execute("DELETE FROM promedio_estudiante WHERE estudiante_id=%s", (estudiante_id,))
+    finally:
+        cursor.close()
+
+def _reconstruir(cursor, estudiante_ids=None):
+    """Rehace promedio_ciclo y promedio_estudiante desde las notas (vivas y archivadas)."""
+    filtro_p, filtro_ev, params = "", "", []
+    if estudiante_ids is not None:
+        marcadores = ", ".join(["%s"] * len(estudiante_ids))
+        filtro_p = f" WHERE estudiante_id IN ({marcadores})"
+        filtro_ev = f" WHERE ev.id_estudiante IN ({marcadores})"
+        params = list(estudiante_ids)
+    cursor.execute("DELETE FROM promedio_ciclo" + filtro_p, params)
+    cursor.execute("DELETE FROM promedio_estudiante" + filtro_p, params)
+    cursor.execute(f"""
+        INSERT INTO promedio_ciclo (estudiante_id, ciclo, suma_ponderada, creditos)
+        SELECT ev.id_estudiante, c.ciclo, SUM(ev.nota * c.creditos), SUM(c.creditos)
+        FROM (
+            SELECT id_estudiante, id_curso, nota FROM evaluaciones
+            UNION ALL
+            SELECT id_estudiante, id_curso, nota FROM evaluaciones_archivo
+        ) ev
+        JOIN cursos c ON ev.id_curso = c.id{filtro_ev}
+        GROUP BY ev.id_estudiante, c.ciclo
+    """, params)
+    cursor.execute(f"""
+        INSERT INTO promedio_estudiante
+            (estudiante_id, carrera, ciclo, suma_ponderada, creditos, promedio)
+        SELECT e.id, e.carrera, e.ciclo, SUM(p.suma_ponderada), SUM(p.creditos),
+               IF(SUM(p.creditos) > 0, SUM(p.suma_ponderada) / SUM(p.creditos), 0)
+        FROM promedio_ciclo p
+        JOIN estudiantes e ON p.estudiante_id = e.id{filtro_p.replace("estudiante_id", "p.estudiante_id")}
+        GROUP BY e.id, e.carrera, e.ciclo
+    """, params)
+    return cursor.rowcount
+
+def reconstruir_promedios():
+    """Recalcula todo desde evaluaciones, incluidas las archivadas (carga inicial o reparación)."""
+    from archivado import ESQUEMA_ARCHIVO   # archivado importa este módulo
+    ensure_schema("promedios", ESQUEMA_PROMEDIOS)
+    ensure_schema("archivo", ESQUEMA_ARCHIVO)
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        filas = _reconstruir(cursor)
+        conn.commit()
+        return filas
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def recalcular_promedios_curso(conn, curso_id):
+    """
+    Tras cambiar los créditos o el ciclo de un curso: rehace los promedios de los
+    estudiantes con notas en él, que se sumaron con el peso o el ciclo anteriores.
+    Llamar después del UPDATE del curso y en la misma transacción.
+    """
+    from archivado import ESQUEMA_ARCHIVO
+    ensure_schema("promedios", ESQUEMA_PROMEDIOS)
+    ensure_schema("archivo", ESQUEMA_ARCHIVO)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT id_estudiante FROM evaluaciones WHERE id_curso = %s
+            UNION
+            SELECT id_estudiante FROM evaluaciones_archivo WHERE id_curso = %s
+        """, (curso_id, curso_id))
+        estudiante_ids = [fila[0] for fila in cursor.fetchall()]
+        if estudiante_ids:
+            _reconstruir(cursor, estudiante_ids)
+    finally:
+        cursor.close()
+
+def _promedio(suma, creditos):
+    return round(float(suma) / creditos, 3) if creditos else None
+
+# ======================================================
+# HISTORIAL DE NOTAS (TRANSCRIPT) DE UN ESTUDIANTE (GET)
+# ======================================================
+@promedios_bp.route("/estudiante/<string:codigo>", methods=["GET"])
+def transcript_estudiante(codigo):
+    inicio = time.time()
+    conn = None
+    try:
+        ensure_schema("promedios", ESQUEMA_PROMEDIOS)
+        conn = get_connection(lectura=True)
+        cursor = conn.cursor(dictionary=True)
+
+        cursor.execute("""
+            SELECT e.id, e.codigo, e.nombre, e.carrera, e.ciclo,
+                   p.suma_ponderada, p.creditos, p.promedio
+            FROM estudiantes e
+            LEFT JOIN promedio_estudiante p ON p.estudiante_id = e.id
+            WHERE e.codigo = %s
+        """, (codigo,))
+        est = cursor.fetchone()
+
+        if not est:
+            log_event(SERVICE, "WARNING", "GET", f"Estudiante {codigo} no encontrado", inicio)
+            return jsonify({"status": "error", "message": "Estudiante no encontrado"}), 404
+
+        cursor.execute("""
+            SELECT ciclo, suma_ponderada, creditos
+            FROM promedio_ciclo
+            WHERE estudiante_id = %s
+            ORDER BY ciclo ASC
+        """, (est["id"],))
+        ciclos = [
+            {"ciclo": f["ciclo"], "creditos": f["creditos"],
+             "promedio": _promedio(f["suma_ponderada"], f["creditos"])}
+            for f in cursor.fetchall()
+        ]
+
+        puesto = None
+        total_grupo = None
+        if est["promedio"] is not None:
+            # Lecturas por rango sobre idx_ranking
+            cursor.execute("""
+                SELECT COUNT(*) AS mejores FROM promedio_estudiante
+                WHERE carrera=%s AND ciclo=%s AND promedio > %s
+            """, (est["carrera"], str(est["ciclo"]), est["promedio"]))
+            puesto = cursor.fetchone()["mejores"] + 1
+            cursor.execute("""
+                SELECT COUNT(*) AS total FROM promedio_estudiante
+                WHERE carrera=%s AND ciclo=%s
+            """, (est["carrera"], str(est["ciclo"])))
+            total_grupo = cursor.fetchone()["total"]
+
+        log_event(SERVICE, "INFO", "GET", f"Historial de notas de {codigo} recuperado", inicio)
+        return jsonify({
+            "status": "success",
+            "codigo_estudiante": est["codigo"],
+            "nombre": est["nombre"],
+            "carrera": est["carrera"],
+            "ciclo": est["ciclo"],
+            "creditos": est["creditos"] or 0,
+            "promedio": _promedio(est["suma_ponderada"] or 0, est["creditos"] or 0),
+            "puesto": puesto,
+            "total_grupo": total_grupo,
+            "ciclos": ciclos
+        }), 200
+    except Exception as e:
+        log_event(SERVICE, "ERROR", "GET", f"Error al obtener historial de notas de {codigo}: {e}", inicio)
+        return jsonify({"status": "error", "message": "Error interno del servidor"}), 500
+    finally:
+        if conn:
+            cursor.close()
+            conn.close()
+
+# ======================================================
+# RANKING POR CARRERA Y CICLO (GET, paginado por cursor)
+# ?carrera=...&ciclo=...&limite=50&despues=<promedio>_<estudiante_id>
+# ======================================================
+@promedios_bp.route("/ranking", methods=["GET"])
+def ranking():
+    inicio = time.time()
+    carrera = request.args.get("carrera")
+    ciclo = request.args.get("ciclo")
+    despues = request.args.get("despues")
+
+    if not carrera or not ciclo:
+        log_event(SERVICE, "WARNING", "GET", "Ranking sin carrera o ciclo", inicio)
+        return jsonify({"status": "error", "message": "Debe indicar carrera y ciclo"}), 400
+
+    try:
+        limite = min(max(int(request.args.get("limite", 50)), 1), MAX_LIMITE_RANKING)
+        if despues:
+            ultimo_promedio, ultimo_id = despues.split("_")
+            ultimo_promedio, ultimo_id = float(ultimo_promedio), int(ultimo_id)
+    except ValueError:
+        log_event(SERVICE, "WARNING", "GET", f"Parámetros de ranking inválidos: {request.args}", inicio)
+        return jsonify({"status": "error", "message": "Parámetros de paginación inválidos"}), 400
+
+    conn = None
+    try:
+        ensure_schema("promedios", ESQUEMA_PROMEDIOS)
+        conn = get_connection(lectura=True)
+        cursor = conn.cursor(dictionary=True)
+
+        # Búsqueda por rango en idx_ranking (sin OFFSET)
+        sql = """
+            SELECT p.estudiante_id, e.codigo, e.nombre, p.creditos, p.promedio
+            FROM promedio_estudiante p
+            JOIN estudiantes e ON e.id = p.estudiante_id
+            WHERE p.carrera = %s AND p.ciclo = %s
+        """
+        params = [carrera, ciclo]
+        if despues:
+            sql += " AND (p.promedio < %s OR (p.promedio = %s AND p.estudiante_id > %s))"
+            params += [ultimo_promedio, ultimo_promedio, ultimo_id]
+        sql += " ORDER BY p.promedio DESC, p.estudiante_id ASC LIMIT %s"
+        params.append(limite)
+        cursor.execute(sql, params)
+        filas = cursor.fetchall()
+
+        data = []
+        if filas:
+            primero = filas[0]
+            # Puesto (empates comparten puesto) y posición global del primero de la página
+            cursor.execute("""
+                SELECT
+                    SUM(promedio > %s) AS mejores,
+                    SUM(promedio > %s OR (promedio = %s AND estudiante_id < %s)) AS anteriores
+                FROM promedio_estudiante
+                WHERE carrera = %s AND ciclo = %s AND promedio >= %s
+            """, (primero["promedio"], primero["promedio"], primero["promedio"],
+                  primero["estudiante_id"], carrera, ciclo, primero["promedio"]))
+            conteo = cursor.fetchone()
+            puesto = int(conteo["mejores"] or 0) + 1
+            posicion = int(conteo["anteriores"] or 0) + 1
+
+            anterior = None
+            for i, fila in enumerate(filas):
+                if i and fila["promedio"] != anterior:
+                    puesto = posicion + i
+                anterior = fila["promedio"]
+                data.append({
+                    "puesto": puesto,
+                    "codigo_estudiante": fila["codigo"],
+                    "nombre": fila["nombre"],
+                    "creditos": fila["creditos"],
+                    "promedio": float(fila["promedio"])
+                })
+
+        siguiente = None
+        if len(filas) == limite:
+            siguiente = f"{filas[-1]['promedio']}_{filas[-1]['estudiante_id']}"
+
+        log_event(SERVICE, "INFO", "GET", f"Ranking {carrera} ciclo {ciclo} consultado", inicio)
+        return jsonify({"status": "success", "data": data, "siguiente": siguiente}), 200
+    except Exception as e:
+        log_event(SERVICE, "ERROR", "GET", f"Error al consultar ranking: {e}", inicio)
+        return jsonify({"status": "error", "message": "Error al consultar ranking"}), 500
+    finally:
+        if conn:
+            cursor.close()
+            conn.close()
+
+# ======================================================
+# LÍNEA DE COMANDOS: python promedios.py --reconstruir
+# ======================================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mantenimiento de promedios ponderados")
+    parser.add_argument("--reconstruir", action="store_true",
+                        help="Recalcula todos los promedios desde la tabla evaluaciones")
+    args = parser.parse_args()
+    if args.reconstruir:
+        total = reconstruir_promedios()
+        print(f"Promedios reconstruidos para {total} estudiantes")
+    else:
+        parser.print_help()
@@ -4,12 +4,94 @@ from db import get_connection
 
 reportes_bp = Blueprint("reportes", __name__)
 
+# =====================================================
+# Consultas de reportes (usadas por la página y por los trabajos en segundo plano)
+# =====================================================
+def consultar_notas(cursor, alumno_id, opcion):
+    if opcion == "3_ultimos":
+        query = """
+        SELECT c.nombre AS curso, c.codigo, e.nota, m.ciclo
+        FROM evaluaciones e
+        JOIN matriculas m ON e.matricula_id = m.id
+        JOIN cursos c ON m.curso_id = c.id
+        WHERE m.estudiante_id = %s
+        ORDER BY m.ciclo DESC
+        LIMIT 3;
+        """
+    elif opcion == "ultimo":
+        query = """
+        SELECT c.nombre AS curso, c.codigo, e.nota, m.ciclo
+        FROM evaluaciones e
+        JOIN matriculas m ON e.matricula_id = m.id
+        JOIN cursos c ON m.curso_id = c.id
+        WHERE m.estudiante_id = %s
+        ORDER BY m.ciclo DESC
+        LIMIT 1;
+        """
+    else:  # Reporte general
+        query = """
+        SELECT c.nombre AS curso, c.codigo, e.nota, m.ciclo
+        FROM evaluaciones e
+        JOIN matriculas m ON e.matricula_id = m.id
+        JOIN cursos c ON m.curso_id = c.id
+        WHERE m.estudiante_id = %s
+        ORDER BY m.ciclo DESC;
+        """
+
+    cursor.execute(query, (alumno_id,))
+    return cursor.fetchall()
+
+def reporte_notas_alumno(parametros):
+    """Trabajo 'evaluaciones': notas de un alumno (mismas opciones que la página)."""
+    # En el primario: el resultado se guarda en caché con la versión de datos del primario
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        notas = consultar_notas(cursor, parametros.get("alumno_id"), parametros.get("opcion"))
+        return {"alumno_id": parametros.get("alumno_id"), "opcion": parametros.get("opcion"), "notas": notas}
+    finally:
+        cursor.close()
+        conn.close()
+
+def reporte_estadisticas_ciclo(parametros):
+    """Trabajo 'estadisticas_ciclo': matriculados y notas por curso (opcionalmente de un ciclo)."""
+    # En el primario: el resultado se guarda en caché con la versión de datos del primario
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        query = """
+        SELECT c.codigo, c.nombre AS curso, c.ciclo, c.creditos,
+               COALESCE(m.matriculados, 0) AS matriculados,
+               COALESCE(ev.evaluados, 0) AS evaluados,
+               ev.promedio, ev.nota_minima, ev.nota_maxima, ev.aprobados
+        FROM cursos c
+        LEFT JOIN (
+            SELECT curso_id, COUNT(*) AS matriculados FROM matriculas GROUP BY curso_id
+        ) m ON m.curso_id = c.id
+        LEFT JOIN (
+            SELECT id_curso, COUNT(*) AS evaluados, ROUND(AVG(nota), 2) AS promedio,
+                   MIN(nota) AS nota_minima, MAX(nota) AS nota_maxima,
+                   SUM(nota >= 10.5) AS aprobados
+            FROM evaluaciones GROUP BY id_curso
+        ) ev ON ev.id_curso = c.id
+        """
+        params = []
+        if parametros.get("ciclo"):
+            query += " WHERE c.ciclo = %s"
+            params.append(parametros["ciclo"])
+        query += " ORDER BY c.ciclo, c.nombre"
+        cursor.execute(query, params)
+        return {"ciclo": parametros.get("ciclo"), "cursos": cursor.fetchall()}
+    finally:
+        cursor.close()
+        conn.close()
+
 # =====================================================
 # Página principal de Reportes
 # =====================================================
 @reportes_bp.route("/reporte_evaluaciones", methods=["GET", "POST"])
 def reporte_evaluaciones():
-    conn = get_connection()
+    conn = get_connection(lectura=True)
     cursor = conn.cursor(dictionary=True)
 
     # 🔹 Obtener lis2ta de alumnos para el selector
@@ -26,38 +108,7 @@ def reporte_evaluaciones():
         opcion = request.form.get("opcion")
         alumno_seleccionado = alumno_id
 
-        if opcion == "3_ultimos":
-            query = """
-            SELECT c.nombre AS curso, c.codigo, e.nota, m.ciclo
-            FROM evaluaciones e
-            JOIN matriculas m ON e.matricula_id = m.id
-            JOIN cursos c ON m.curso_id = c.id
-            WHERE m.estudiante_id = %s
-            ORDER BY m.ciclo DESC
-            LIMIT 3;
-            """
-        elif opcion == "ultimo":
-            query = """
-            SELECT c.nombre AS curso, c.codigo, e.nota, m.ciclo
-            FROM evaluaciones e
-            JOIN matriculas m ON e.matricula_id = m.id
-            JOIN cursos c ON m.curso_id = c.id
-            WHERE m.estudiante_id = %s
-            ORDER BY m.ciclo DESC
-            LIMIT 1;
-            """
-        else:  # Reporte general
-            query = """
-            SELECT c.nombre AS curso, c.codigo, e.nota, m.ciclo
-            FROM evaluaciones e
-            JOIN matriculas m ON e.matricula_id = m.id
-            JOIN cursos c ON m.curso_id = c.id
-            WHERE m.estudiante_id = %s
-            ORDER BY m.ciclo DESC;
-            """
-
-        cursor.execute(query, (alumno_id,))
-        notas = cursor.fetchall()
+        notas = consultar_notas(cursor, alumno_id, opcion)
 
         if not notas:
             mensaje = "❗ Falta llevar los cursos o aún no tiene notas registradas."
@@ -0,0 +1,131 @@
+# resumen.py
+from flask import Blueprint, jsonify
+from db import get_connection
+from logger import log_event
+from datetime import datetime
+import os, threading, time
+
+resumen_bp = Blueprint("resumen", __name__)
+SERVICE = "continental.edu.pe/soa/resumen-service"
+
+# Antigüedad máxima del resumen antes de recalcularlo en segundo plano
+RESUMEN_TTL = int(os.environ.get("RESUMEN_TTL", "60"))
+DIAS_MATRICULAS = 30
+
+_resumen = {"data": None, "generado": 0.0}
+_refresco_lock = threading.Lock()
+_refrescando = threading.Event()
+
+# ======================================================
+# CÁLCULO DEL RESUMEN (fuera del camino del request)
+# ======================================================
+def calcular_resumen():
+    conn = get_connection(deadline=False, lectura=True)
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT estado, carrera, COUNT(*) AS total
+            FROM estudiantes GROUP BY estado, carrera
+        """)
+        por_estado, por_carrera = {}, {}
+        for fila in cursor.fetchall():
+            por_estado[fila["estado"]] = por_estado.get(fila["estado"], 0) + fila["total"]
+            por_carrera[fila["carrera"]] = por_carrera.get(fila["carrera"], 0) + fila["total"]
+
+        cursor.execute("SELECT COUNT(*) AS total FROM cursos")
+        cursos = cursor.fetchone()["total"]
+
+        cursor.execute("""
+            SELECT c.ciclo, COUNT(*) AS total
+            FROM matriculas m JOIN cursos c ON m.curso_id = c.id
+            GROUP BY c.ciclo ORDER BY c.ciclo
+        """)
+        matriculas_por_ciclo = {str(f["ciclo"]): f["total"] for f in cursor.fetchall()}
+
+        cursor.execute("""
+            SELECT DATE(fecha) AS dia, COUNT(*) AS total
+            FROM matriculas
+            WHERE fecha >= CURDATE() - INTERVAL %s DAY
+            GROUP BY DATE(fecha) ORDER BY dia
+        """, (DIAS_MATRICULAS,))
+        matriculas_por_dia = {str(f["dia"]): f["total"] for f in cursor.fetchall()}
+
+        cursor.execute("SELECT COUNT(*) AS total FROM evaluaciones")
+        evaluaciones = cursor.fetchone()["total"]
+
+        cursor.execute("""
+            SELECT categoria, COUNT(*) AS total
+            FROM logs
+            WHERE fecha_hora >= NOW() - INTERVAL 1 DAY
+            GROUP BY categoria
+        """)
+        logs = {f["categoria"]: f["total"] for f in cursor.fetchall()}
+        total_logs = sum(logs.values())
+
+        return {
+            "estudiantes": {
+                "total": sum(por_estado.values()),
+                "por_estado": por_estado,
+                "por_carrera": por_carrera,
+            },
+            "cursos": cursos,
+            "matriculas": {
+                "total": sum(matriculas_por_ciclo.values()),
+                "por_ciclo": matriculas_por_ciclo,
+                "por_dia": matriculas_por_dia,
+            },
+            "evaluaciones": evaluaciones,
+            "logs_24h": {
+                "total": total_logs,
+                "errores": logs.get("ERROR", 0),
+                "tasa_error": round(logs.get("ERROR", 0) / total_logs, 4) if total_logs else 0,
+            },
+            "generado_en": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+    finally:
+        cursor.close()
+        conn.close()
+
+def _refrescar():
+    inicio = time.time()
+    try:
+        data = calcular_resumen()
+        with _refresco_lock:
+            _resumen["data"] = data
+            _resumen["generado"] = time.time()
+    except Exception as e:
+        log_event(SERVICE, "ERROR", "SERVICE", f"Error al recalcular resumen: {e}", inicio)
+    finally:
+        _refrescando.clear()
+
+def _refrescar_en_segundo_plano():
+    """Lanza un solo recálculo a la vez; los demás requests siguen usando el resumen anterior."""
+    with _refresco_lock:
+        if _refrescando.is_set():
+            return
+        _refrescando.set()
+    threading.Thread(target=_refrescar, name="resumen-dashboard", daemon=True).start()
+
+# ======================================================
+# RESUMEN PARA EL DASHBOARD (GET)
+# ======================================================
+@resumen_bp.route("/", methods=["GET"])
+def obtener_resumen():
+    inicio = time.time()
+    with _refresco_lock:
+        data, generado = _resumen["data"], _resumen["generado"]
+
+    if data is None:
+        # Primer uso del proceso: se calcula una vez de forma síncrona
+        try:
+            data = calcular_resumen()
+            with _refresco_lock:
+                _resumen["data"] = data
+                _resumen["generado"] = time.time()
+        except Exception as e:
+            log_event(SERVICE, "ERROR", "GET", f"Error al calcular resumen: {e}", inicio)
+            return jsonify({"status": "error", "message": "Resumen no disponible"}), 503
+    elif time.time() - generado > RESUMEN_TTL:
+        _refrescar_en_segundo_plano()
+
+    return jsonify({"status": "success", "data": data}), 200
@@ -0,0 +1,308 @@
+# trabajos.py
+from flask import Blueprint, request, jsonify, send_file
+from concurrent.futures import ThreadPoolExecutor
+from db import get_connection, ensure_schema
+from logger import log_event
+from eventos import publicar_pendientes
+from reportes import reporte_notas_alumno, reporte_estadisticas_ciclo
+from datetime import datetime, timedelta
+import hashlib, json, os, threading, time, uuid
+
+trabajos_bp = Blueprint("trabajos", __name__)
+SERVICE = "continental.edu.pe/soa/reportes-service"
+
+TRABAJOS_WORKERS = int(os.environ.get("TRABAJOS_WORKERS", "2"))
+# Un trabajo 'ejecutando' sin avances en este tiempo se da por abandonado (proceso caído)
+TRABAJO_ABANDONADO = int(os.environ.get("TRABAJO_ABANDONADO", "900"))
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "reportes_cache")
+
+# Tipos de reporte disponibles: nombre -> función(parametros) que devuelve un dict serializable
+TIPOS_REPORTE = {
+    "evaluaciones": reporte_notas_alumno,
+    "estadisticas_ciclo": reporte_estadisticas_ciclo,
+}
+
+ESQUEMA_TRABAJOS = [
+    """
+    CREATE TABLE IF NOT EXISTS trabajos_reporte (
+        id CHAR(32) PRIMARY KEY,
+        tipo VARCHAR(50) NOT NULL,
+        parametros TEXT NOT NULL,
+        clave CHAR(64) NOT NULL,
+        estado VARCHAR(20) NOT NULL,
+        archivo VARCHAR(255) NULL,
+        error TEXT NULL,
+        creado_en DATETIME NOT NULL,
+        actualizado_en DATETIME NOT NULL,
+        INDEX idx_clave (clave, estado),
+        INDEX idx_estado (estado)
+    )
+    """
+]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# ======================================================
+# POOL DE TRABAJADORES
+# ======================================================
+def _get_executor():
+    """
+    Crea el pool la primera vez y reencola los trabajos pendientes o abandonados.
+    Si otro proceso ya los tomó, _reclamar lo detecta y no se ejecutan dos veces.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=TRABAJOS_WORKERS,
+                                               thread_name_prefix="trabajo-reporte")
+                for trabajo_id in _trabajos_sin_terminar():
+                    _executor.submit(_ejecutar, trabajo_id)
+    return _executor
+
+def _trabajos_sin_terminar():
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT id FROM trabajos_reporte
+            WHERE estado = 'pendiente' OR (estado = 'ejecutando' AND actualizado_en < %s)
+        """, (datetime.now() - timedelta(seconds=TRABAJO_ABANDONADO),))
+        return [fila[0] for fila in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+def _reclamar(trabajo_id):
+    """Pasa el trabajo a 'ejecutando' solo si nadie lo tomó antes (un UPDATE atómico)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        ahora = datetime.now()
+        cursor.execute("""
+            UPDATE trabajos_reporte SET estado='ejecutando', actualizado_en=%s
+            WHERE id=%s AND (estado='pendiente' OR (estado='ejecutando' AND actualizado_en < %s))
+        """, (ahora, trabajo_id, ahora - timedelta(seconds=TRABAJO_ABANDONADO)))
+        conn.commit()
+        return cursor.rowcount == 1
+    finally:
+        cursor.close()
+        conn.close()
+
+def _purgar_versiones_anteriores(trabajo):
+    """
+    Borra los archivos de caché del mismo reporte (tipo y parámetros) con versiones
+    de datos anteriores: ya no se van a servir. Solo los de trabajos creados antes,
+    para que uno lento de una versión vieja no borre el resultado de una más nueva.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        condicion = "tipo=%s AND parametros=%s AND clave<>%s AND creado_en < %s AND archivo IS NOT NULL"
+        params = (trabajo["tipo"], trabajo["parametros"], trabajo["clave"], trabajo["creado_en"])
+        cursor.execute(f"SELECT DISTINCT archivo FROM trabajos_reporte WHERE {condicion}", params)
+        for (archivo,) in cursor.fetchall():
+            try:
+                os.remove(archivo)
+            except FileNotFoundError:
+                pass
+        cursor.execute(f"UPDATE trabajos_reporte SET estado='vencido', archivo=NULL WHERE {condicion}", params)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+def _actualizar_estado(trabajo_id, estado, archivo=None, error=None):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE trabajos_reporte SET estado=%s, archivo=%s, error=%s, actualizado_en=%s
+            WHERE id=%s
+        """, (estado, archivo, error, datetime.now(), trabajo_id))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+def _obtener_trabajo(trabajo_id):
+    conn = get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("""
+            SELECT id, tipo, parametros, clave, estado, archivo, error, creado_en, actualizado_en
+            FROM trabajos_reporte WHERE id=%s
+        """, (trabajo_id,))
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+def _ejecutar(trabajo_id):
+    inicio = time.time()
+    trabajo = _obtener_trabajo(trabajo_id)
+    if not trabajo:
+        return
+    if not _reclamar(trabajo_id):
+        return      # ya lo tomó otro trabajador o proceso
+    try:
+        resultado = TIPOS_REPORTE[trabajo["tipo"]](json.loads(trabajo["parametros"]))
+
+        # Escritura atómica: el archivo final solo aparece completo
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        archivo = os.path.join(CACHE_DIR, f"{trabajo['clave']}.json")
+        temporal = f"{archivo}.{trabajo_id}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, default=str)
+        os.replace(temporal, archivo)
+
+        _actualizar_estado(trabajo_id, "terminado", archivo=archivo)
+        log_event(SERVICE, "INFO", "SERVICE", f"Reporte {trabajo['tipo']} ({trabajo_id}) generado", inicio)
+        try:
+            _purgar_versiones_anteriores(trabajo)
+        except Exception as e:
+            log_event(SERVICE, "WARNING", "SERVICE", f"No se purgó la caché de {trabajo_id}: {e}", inicio)
+    except Exception as e:
+        log_event(SERVICE, "ERROR", "SERVICE", f"Error al generar reporte {trabajo_id}: {e}", inicio)
+        try:
+            _actualizar_estado(trabajo_id, "error", error=str(e))
+        except Exception:
+            pass
+
+# ======================================================
+# CLAVE DE CACHÉ: parámetros + versión de los datos
+# ======================================================
+def version_datos():
+    """
+    Última secuencia publicada del outbox: cambia con cualquier escritura confirmada
+    de matrículas, notas, estudiantes, cursos, archivado o cierre de ciclo. MAX(id)
+    no sirve: un evento de una transacción larga puede confirmarse con un id menor.
+    """
+    publicar_pendientes()
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT ultima FROM outbox_secuencia WHERE id = 1")
+        return cursor.fetchone()[0]
+    finally:
+        cursor.close()
+        conn.close()
+
+def _clave(tipo, parametros, version):
+    base = json.dumps({"tipo": tipo, "parametros": parametros, "version": version}, sort_keys=True)
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+def _respuesta_trabajo(trabajo):
+    return {
+        "id": trabajo["id"],
+        "tipo": trabajo["tipo"],
+        "parametros": json.loads(trabajo["parametros"]),
+        "estado": trabajo["estado"],
+        "error": trabajo["error"],
+        "creado_en": str(trabajo["creado_en"]),
+        "actualizado_en": str(trabajo["actualizado_en"]),
+    }
+
+# ======================================================
+# ENCOLAR REPORTE (POST)
+# {"tipo": "estadisticas_ciclo", "parametros": {"ciclo": 3}}
+# ======================================================
+@trabajos_bp.route("/trabajos", methods=["POST"])
+def encolar_reporte():
+    inicio = time.time()
+    data = request.get_json() or {}
+    tipo = data.get("tipo")
+    parametros = data.get("parametros") or {}
+
+    if tipo not in TIPOS_REPORTE or not isinstance(parametros, dict):
+        log_event(SERVICE, "WARNING", "POST", f"Tipo de reporte inválido: {tipo}", inicio)
+        return jsonify({"status": "error", "message": f"Tipos válidos: {sorted(TIPOS_REPORTE)}"}), 400
+
+    conn = None
+    try:
+        ensure_schema("trabajos_reporte", ESQUEMA_TRABAJOS)
+        # El pool se crea (y reencola lo pendiente) antes de insertar este trabajo
+        executor = _get_executor()
+        clave = _clave(tipo, parametros, version_datos())
+        archivo = os.path.join(CACHE_DIR, f"{clave}.json")
+        ahora = datetime.now()
+
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+
+        # Mismo reporte ya en curso: se reutiliza el trabajo
+        cursor.execute("""
+            SELECT id FROM trabajos_reporte
+            WHERE clave=%s AND estado IN ('pendiente', 'ejecutando')
+            LIMIT 1
+        """, (clave,))
+        en_curso = cursor.fetchone()
+        if en_curso:
+            log_event(SERVICE, "INFO", "POST", f"Reporte {tipo} ya en curso ({en_curso['id']})", inicio)
+            return jsonify({"status": "success", "id": en_curso["id"], "estado": "pendiente"}), 202
+
+        trabajo_id = uuid.uuid4().hex
+        en_cache = os.path.exists(archivo)
+        estado = "terminado" if en_cache else "pendiente"
+        cursor.execute("""
+            INSERT INTO trabajos_reporte (id, tipo, parametros, clave, estado, archivo, creado_en, actualizado_en)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, (trabajo_id, tipo, json.dumps(parametros, sort_keys=True), clave, estado,
+              archivo if en_cache else None, ahora, ahora))
+        conn.commit()
+
+        if en_cache:
+            log_event(SERVICE, "INFO", "POST", f"Reporte {tipo} servido desde caché ({trabajo_id})", inicio)
+            return jsonify({"status": "success", "id": trabajo_id, "estado": estado}), 200
+
+        executor.submit(_ejecutar, trabajo_id)
+        log_event(SERVICE, "INFO", "POST", f"Reporte {tipo} encolado ({trabajo_id})", inicio)
+        return jsonify({"status": "success", "id": trabajo_id, "estado": estado}), 202
+    except Exception as e:
+        log_event(SERVICE, "ERROR", "POST", f"Error al encolar reporte {tipo}: {e}", inicio)
+        return jsonify({"status": "error", "message": "Error al encolar reporte"}), 500
+    finally:
+        if conn:
+            cursor.close()
+            conn.close()
+
+# ======================================================
+# ESTADO DEL TRABAJO (GET)
+# ======================================================
+@trabajos_bp.route("/trabajos/<string:trabajo_id>", methods=["GET"])
+def estado_reporte(trabajo_id):
+    inicio = time.time()
+    try:
+        ensure_schema("trabajos_reporte", ESQUEMA_TRABAJOS)
+        trabajo = _obtener_trabajo(trabajo_id)
+        if not trabajo:
+            log_event(SERVICE, "WARNING", "GET", f"Trabajo {trabajo_id} no encontrado", inicio)
+            return jsonify({"status": "error", "message": "Trabajo no encontrado"}), 404
+        return jsonify({"status": "success", "data": _respuesta_trabajo(trabajo)}), 200
+    except Exception as e:
+        log_event(SERVICE, "ERROR", "GET", f"Error al consultar trabajo {trabajo_id}: {e}", inicio)
+        return jsonify({"status": "error", "message": "Error al consultar trabajo"}), 500
+
+# ======================================================
+# DESCARGAR RESULTADO (GET)
+# ======================================================
+@trabajos_bp.route("/trabajos/<string:trabajo_id>/resultado", methods=["GET"])
+def resultado_reporte(trabajo_id):
+    inicio = time.time()
+    try:
+        ensure_schema("trabajos_reporte", ESQUEMA_TRABAJOS)
+        trabajo = _obtener_trabajo(trabajo_id)
+        if not trabajo:
+            log_event(SERVICE, "WARNING", "GET", f"Trabajo {trabajo_id} no encontrado", inicio)
+            return jsonify({"status": "error", "message": "Trabajo no encontrado"}), 404
+        if trabajo["estado"] != "terminado" or not trabajo["archivo"] or not os.path.exists(trabajo["archivo"]):
+            return jsonify({"status": "error", "message": "El reporte aún no está disponible",
+                            "estado": trabajo["estado"]}), 409
+
+        log_event(SERVICE, "INFO", "GET", f"Descarga de reporte {trabajo_id}", inicio)
+        return send_file(trabajo["archivo"], mimetype="application/json",
+                         as_attachment=True, download_name=f"{trabajo['tipo']}_{trabajo_id}.json")
+    except Exception as e:
+        log_event(SERVICE, "ERROR", "GET", f"Error al descargar reporte {trabajo_id}: {e}", inicio)
+        return jsonify({"status": "error", "message": "Error al descargar reporte"}), 500